@@ -1,11 +1,54 @@
+import importlib
+import logging
+import os
+import threading
 import streamlit as st
-import pnl  # <--- IMPORTA pnl.py (asegurate que exista con ese nombre)
+
+# --- registro de submódulos: cada uno se importa (y carga sus datos) recién cuando se elige ---
+SUBMODULOS = {
+    "P&L": "pnl",  # <--- pnl.py (asegurate que exista con ese nombre)
+}
+# submódulos que se importan y precalientan en segundo plano desde la primera corrida del proceso
+# (Streamlit no ejecuta app.py hasta que se conecta una sesión): la carga arranca antes de
+# dibujar el sidebar y show() espera esa misma carga en lugar de repetirla
+PRECALENTAR = [] if os.environ.get("APP_PRECALENTAR", "1") == "0" else ["P&L"]
+
+def _modulo(nombre: str):
+    return importlib.import_module(SUBMODULOS[nombre])
+
+@st.cache_resource(show_spinner=False)
+def _precalienta():
+    def tarea():
+        for nombre in PRECALENTAR:
+            try:
+                mod = _modulo(nombre)
+                if hasattr(mod, "precalienta"):
+                    mod.precalienta()
+            except Exception:
+                logging.getLogger(__name__).exception("no se pudo precalentar %s", nombre)
+    hilo = threading.Thread(target=tarea, name="app-precalentar", daemon=True)
+    hilo.start()
+    return hilo
 
 st.set_page_config(page_title="Panel de Módulos", layout="wide")
+_precalienta()
 
 st.sidebar.title("Navegación")
 st.sidebar.caption("build v3")  # marca para verificar el deploy
-submodulo = st.sidebar.selectbox("📊 Submódulo Administración:", ["P&L"], index=0)
+submodulo = st.sidebar.selectbox("📊 Submódulo Administración:", list(SUBMODULOS), index=0)
+
+_modulo(submodulo).show()
 
-if submodulo == "P&L":
-    pnl.show()
+# --- sección de depuración: tiempos por etapa del último rerun ---
+if st.sidebar.checkbox("🛠️ Rendimiento", value=False, key="_debug_rendimiento"):
+    import metricas
+    corrida = metricas.ultima_corrida()
+    if corrida:
+        st.sidebar.caption(f"Último rerun: {metricas.total_corrida(corrida) * 1000:.0f} ms")
+        st.sidebar.dataframe(
+            [{"etapa": ("↳ " if r["padre"] else "") + r["etapa"], "ms": round(r["seg"] * 1000, 1), "filas": r["filas"],
+              "KB": None if r["bytes"] is None else round(r["bytes"] / 1024, 1)} for r in corrida],
+            hide_index=True, width="stretch",
+        )
+    st.sidebar.download_button("Descargar métricas (Prometheus)", metricas.texto_prometheus(),
+                               file_name="pnl_metricas.prom", mime="text/plain")
@@ -0,0 +1,181 @@
+"""Benchmark del pipeline del P&L con mayores sintéticos.
+
+Uso:
+    python bench_pnl.py                                # 10k, 100k, 1M y 10M filas
+    python bench_pnl.py --filas 10000 100000 --sucursales 40 --salida bench.json
+    python bench_pnl.py --motores pandas duckdb polars  # filtros + niveles con cada motor instalado
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import motores
+import pnl
+
+# estructura del estado de resultados: Cuentas -> SubCuenta -> Lineas
+ESTRUCTURA = {
+    "Ventas": {"Ventas": ["Ventas"]},
+    "Costo": {"Costo Receta": ["Costo Receta"], "Costo AFR": ["Costo AFR"]},
+    "Marketing": {"Gastos de Marketing": ["Gastos de Marketing"], "Reintegro de Marketing": ["Reintegro de Marketing"]},
+    "Gastos Operativos": {
+        "Gastos Personal": [f"Gasto {i}" for i in range(1, 9)],
+        "Gastos Generales": [f"Gasto {i}" for i in range(9, 16)],
+    },
+    "Alquiler": {"Alquileres": ["Alquileres"], "Expensas": ["Expensas"]},
+    "Mantenimiento": {"Mantenimiento de Equipos": ["Mantenimiento de Equipos"],
+                      "Mantenimiento de Edificio": ["Mantenimiento de Edificio"]},
+    "Administracion Central": {"Administracion Central": ["Administracion Central"]},
+    "Royaltie": {"Royalties": ["Royalties"]},
+    "Depreciacion": {"Depreciacion y Amortizacion": ["Depreciacion y Amortizacion"]},
+    "Impuestos a la Renta": {"Impuestos a la Renta": ["Impuestos a la Renta"]},
+}
+TOTALES = ["Margen", "Contribucion", "Resultado Operativo", "Resultado Neto"]  # n0 sin SubCuenta
+
+def genera_mayor(filas: int, sucursales: int = 10, anios=(2022, 2023, 2024), semilla: int = 0):
+    rng = np.random.default_rng(semilla)
+    hojas = [(c, s, l) for c, subs in ESTRUCTURA.items() for s, lineas in subs.items() for l in lineas]
+    hojas += [(c, "", "") for c in TOTALES]
+
+    def por_hoja(valores, orden=None):
+        # mismas categorías que arma el cargador, expandidas por códigos (sin strings por fila)
+        cat = pnl._como_categoria(pd.Series(valores, dtype=object), orden)
+        return pd.Categorical.from_codes(cat.codes[i_hoja], dtype=cat.dtype)
+
+    i_hoja = rng.integers(0, len(hojas), filas)
+    i_anio = rng.integers(0, len(anios), filas)
+    cuentas, subs, lineas = zip(*hojas)
+    periodos = pd.Categorical([f"G-{str(a)[2:]}" for a in anios])
+    df = pd.DataFrame({
+        "Anual": np.asarray(anios)[i_anio],
+        "Periodo": pd.Categorical.from_codes(periodos.codes[i_anio], dtype=periodos.dtype),
+        "Fecha": pd.Categorical.from_codes(rng.integers(0, 12, filas), categories=pnl.ORDEN_MESES, ordered=True),
+        "Sucursal": pd.Categorical.from_codes(rng.integers(0, sucursales, filas), ordered=True,
+                                              categories=[f"Local {i}" for i in range(1, sucursales + 1)]),
+        "Cuentas": por_hoja(cuentas, pnl.ORDEN_CUENTAS),
+        "SubCuenta": por_hoja(subs),
+        "Linea": por_hoja(lineas),
+        "ACT": rng.normal(0, 1e6, filas).round(2),
+        "AA": rng.normal(0, 1e6, filas).round(2),
+        "PPTO": rng.normal(0, 1e6, filas).round(2),
+    })
+    return df
+
+def _mide(fn, repeticiones: int):
+    tiempos = []
+    for _ in range(repeticiones):
+        gc.collect()
+        t0 = time.perf_counter()
+        res = fn()
+        tiempos.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return res, {"seg": min(tiempos), "seg_mediana": float(np.median(tiempos)), "pico_mb": pico / 2**20}
+
+def _payload_grilla(vista):
+    from st_aggrid import GridOptionsBuilder
+    if pnl.PAYLOAD_COMPACTO:
+        vista, _ = pnl._payload_compacto(vista)
+    gb = GridOptionsBuilder.from_dataframe(vista)
+    gb = pnl._grid_format(gb)
+    opciones = gb.build()
+    # st_aggrid serializa los datos como JSON de registros antes de enviarlos al navegador
+    return json.dumps(opciones, default=str), vista.to_json(orient="records")
+
+def corre(filas: int, sucursales: int, repeticiones: int, max_excel: int, tmp: str, motores_=("pandas",)):
+    etapas = {}
+    mayor = genera_mayor(filas, sucursales)
+    mayor = pnl._normaliza_dimensiones(mayor)
+
+    if filas <= max_excel:
+        ruta = os.path.join(tmp, f"mayor_{filas}.xlsx")
+        with pd.ExcelWriter(ruta) as w:
+            mayor.to_excel(w, sheet_name="datos", index=False)
+        pnl.CACHE_DIR = os.path.join(tmp, "cache")
+        _, etapas["carga_excel"] = _mide(lambda: pnl._parsear_excel(ruta), 1)
+        mtime = os.path.getmtime(ruta)
+        pnl._cargar_base(ruta, mtime)  # deja escrito el snapshot
+        _, etapas["carga_snapshot"] = _mide(lambda: pnl._cargar_base(ruta, mtime), repeticiones)
+
+    cubo, etapas["cubo"] = _mide(lambda: pnl._construye_cubo(mayor), repeticiones)
+
+    anios = sorted(mayor["Anual"].unique().tolist())
+    seleccion = ([anios[-1]], None, None, ["Local 1"])
+    f_mayor, etapas["filtros_mayor"] = _mide(lambda: pnl._aplicar_filtros(mayor, *seleccion), repeticiones)
+    _, etapas["niveles_mayor"] = _mide(lambda: pnl._prepara_niveles(f_mayor.copy()), repeticiones)
+
+    f_cubo, etapas["filtros"] = _mide(lambda: pnl._aplicar_filtros(cubo, *seleccion), repeticiones)
+    indice, etapas["indice"] = _mide(lambda: pnl._construye_indice(cubo), repeticiones)
+    _, etapas["filtros_indice"] = _mide(lambda: pnl._aplicar_filtros(cubo, *seleccion, indice=indice), repeticiones)
+    (n0, n1, n2), etapas["niveles"] = _mide(lambda: pnl._prepara_niveles(f_cubo.copy()), repeticiones)
+    for motor in motores_:
+        if motores.disponible(motor):
+            # la primera llamada arma la tabla Arrow del cubo, igual que en la app con cada versión
+            motores.niveles(motor, cubo, filas, *seleccion)
+            _, etapas[f"motor_{motor}"] = _mide(lambda: motores.niveles(motor, cubo, filas, *seleccion), repeticiones)
+
+    todo = {('n0', c) for c in n0["Cuentas"].astype(str)} | {('n1', c, s) for c, s in pnl.N2_ALLOWED_FOR_N1}
+    vista, etapas["vista"] = _mide(lambda: pnl._arma_vista(n0, n1, n2, todo), repeticiones)
+    _, etapas["payload"] = _mide(lambda: _payload_grilla(vista), repeticiones)
+
+    tamanos = {
+        "mayor_mb": mayor.memory_usage(deep=True).sum() / 2**20,
+        "cubo_filas": len(cubo),
+        "cubo_mb": cubo.memory_usage(deep=True).sum() / 2**20,
+        "vista_filas": len(vista),
+        "payload_kb": len(_payload_grilla(vista)[1]) / 1024,
+    }
+    return {"filas": filas, "sucursales": sucursales, "tamanos": tamanos, "etapas": etapas}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    ap.add_argument("--sucursales", type=int, default=10)
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--max-excel", type=int, default=100_000,
+                    help="tamaño máximo para el que se escribe y se lee un .xlsx (openpyxl es lento)")
+    ap.add_argument("--motores", nargs="+", default=["pandas"], choices=motores.MOTORES,
+                    help="motores con los que se miden filtros + niveles sobre el cubo")
+    ap.add_argument("--salida", default="bench_pnl.json")
+    args = ap.parse_args()
+
+    resultado = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "maquina": platform.machine(),
+            "cpus": os.cpu_count(),
+            "motores": [m for m in args.motores if motores.disponible(m)],
+        },
+        "corridas": [],
+    }
+    tmp = tempfile.mkdtemp(prefix="bench_pnl_")
+    try:
+        for n in args.filas:
+            r = corre(n, args.sucursales, args.repeticiones, args.max_excel, tmp, args.motores)
+            resultado["corridas"].append(r)
+            resumen = "  ".join(f"{k}={v['seg']*1000:.1f}ms/{v['pico_mb']:.0f}MB" for k, v in r["etapas"].items())
+            print(f"{n:>11,} filas  {resumen}", flush=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    with open(args.salida, "w", encoding="utf-8") as fh:
+        json.dump(resultado, fh, indent=2, ensure_ascii=False)
+    print(f"resultados en {args.salida}")
+
+if __name__ == "__main__":
+    main()
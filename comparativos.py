@@ -0,0 +1,147 @@
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import pnl
+
+# --- comparativos en el tiempo sobre sumas acumuladas ---
+MODOS = {
+    "mom": "Mes contra mes anterior",
+    "t12m": "Últimos 12 meses vs 12 anteriores",
+    "ytd": "YTD vs YTD año anterior",
+    "tendencia": "Tendencia mensual (12 meses)",
+}
+CLAVES = ["Sucursal", "Cuentas", "SubCuenta"]
+
+_series = {}   # versión de la base -> serie; se guardan solo las últimas
+_series_lock = threading.Lock()
+
+def _indice_mes(anual, fecha):
+    # t = año*12 + mes (0..11); -1 si la fila no se puede ubicar en el tiempo
+    mes = pd.Categorical(fecha.astype(object), categories=pnl.ORDEN_MESES).codes.astype("int64")
+    anio = pd.to_numeric(anual, errors="coerce").to_numpy()
+    t = np.where((mes >= 0) & np.isfinite(anio), np.nan_to_num(anio).astype("int64") * 12 + mes, -1)
+    return t
+
+def construye_serie(cubo):
+    # matriz (clave x mes) por medida y su suma acumulada sobre el eje del tiempo:
+    # cualquier ventana [desde, hasta] es prefijo[hasta+1] - prefijo[desde]
+    df = cubo[[c for c in CLAVES if c in cubo.columns] + [c for c in pnl.MEDIDAS if c in cubo.columns]].copy()
+    if "Sucursal" not in df.columns:
+        df["Sucursal"] = ""
+    t = _indice_mes(cubo["Anual"], cubo["Fecha"]) if {"Anual", "Fecha"} <= set(cubo.columns) else np.full(len(cubo), -1)
+    validos = t >= 0
+    df, t = df[validos], t[validos]
+    if df.empty:
+        return None
+
+    claves = df[CLAVES].drop_duplicates().reset_index(drop=True)
+    fila = pd.MultiIndex.from_frame(claves.astype(str)).get_indexer(pd.MultiIndex.from_frame(df[CLAVES].astype(str)))
+    t_min, t_max = int(t.min()), int(t.max())
+    columnas = t - t_min
+
+    prefijos = {}
+    for m in pnl.MEDIDAS:
+        if m not in df.columns:
+            continue
+        matriz = np.zeros((len(claves), t_max - t_min + 1))
+        np.add.at(matriz, (fila, columnas), df[m].to_numpy(dtype="float64"))
+        prefijos[m] = np.concatenate([np.zeros((len(claves), 1)), np.cumsum(matriz, axis=1)], axis=1)
+    return {"claves": claves, "t_min": t_min, "t_max": t_max, "prefijos": prefijos}
+
+def serie_para(version, cubo):
+    with _series_lock:
+        serie = _series.get(version)
+    if serie is None:
+        serie = construye_serie(cubo)
+        with _series_lock:
+            _series[version] = serie
+            for v in list(_series)[:-2]:
+                del _series[v]
+    return serie
+
+def _mascara_sucursales(serie, sucursales):
+    if not sucursales:
+        return np.ones(len(serie["claves"]), dtype=bool)
+    return serie["claves"]["Sucursal"].astype(str).isin([str(s) for s in sucursales]).to_numpy()
+
+def suma_ventana(serie, desde: int, hasta: int, medida="ACT", sucursales=None):
+    # suma por clave en los meses [desde, hasta]; fuera del rango de la base cuenta como 0
+    p = serie["prefijos"][medida]
+    a = int(np.clip(desde - serie["t_min"], 0, p.shape[1] - 1))
+    b = int(np.clip(hasta - serie["t_min"] + 1, 0, p.shape[1] - 1))
+    valores = p[:, b] - p[:, a] if b > a else np.zeros(p.shape[0])
+    return np.where(_mascara_sucursales(serie, sucursales), valores, 0.0)
+
+def _por_cuenta(serie, valores):
+    claves = serie["claves"]
+    out = pd.DataFrame({"Cuentas": claves["Cuentas"], "valor": valores})
+    return out.groupby("Cuentas", observed=True, sort=True)["valor"].sum()
+
+def ventanas(modo: str, ref: int):
+    if modo == "mom":
+        return (ref, ref), (ref - 1, ref - 1)
+    if modo == "t12m":
+        return (ref - 11, ref), (ref - 23, ref - 12)
+    if modo == "ytd":
+        inicio = (ref // 12) * 12
+        return (inicio, ref), (inicio - 12, ref - 12)
+    raise ValueError(f"modo desconocido: {modo}")
+
+def comparativo(serie, modo: str, ref: int, sucursales=None, medida="ACT"):
+    actual, anterior = ventanas(modo, ref)
+    a = _por_cuenta(serie, suma_ventana(serie, *actual, medida, sucursales))
+    b = _por_cuenta(serie, suma_ventana(serie, *anterior, medida, sucursales))
+    out = pd.DataFrame({"Actual": a, "Anterior": b})
+    out["Var"] = out["Actual"] - out["Anterior"]
+    den = out["Anterior"].to_numpy()
+    out["Var %"] = pnl._div(out["Var"].to_numpy(), np.abs(den))
+    return out.reset_index()
+
+def tendencia(serie, ref: int, meses: int = 12, sucursales=None, medida="ACT"):
+    # un mes = diferencia de dos prefijos: se arma la matriz clave x mes y se agrupa una sola vez
+    ts = list(range(ref - meses + 1, ref + 1))
+    valores = np.column_stack([suma_ventana(serie, t, t, medida, sucursales) for t in ts])
+    tabla = pd.DataFrame(valores, columns=[_etiqueta_mes(t) for t in ts])
+    tabla.insert(0, "Cuentas", serie["claves"]["Cuentas"])
+    return tabla.groupby("Cuentas", observed=True, sort=True).sum().reset_index()
+
+def _etiqueta_mes(t: int) -> str:
+    return f"{pnl.ORDEN_MESES[t % 12][:3]}-{str(t // 12)[2:]}"
+
+def _tiene_datos(serie, t: int) -> bool:
+    i = t - serie["t_min"]
+    return any(np.any(p[:, i + 1] != p[:, i]) for p in serie["prefijos"].values())
+
+def mes_referencia(serie, anios_sel, meses_sel):
+    # último mes con datos dentro de los años/meses seleccionados; si ninguno tiene datos,
+    # el último de los años seleccionados; None si esos años no tienen datos
+    meses = {pnl.ORDEN_MESES.index(m) for m in (meses_sel or []) if m in pnl.ORDEN_MESES}
+    anios = {int(a) for a in (anios_sel or []) if pd.notna(a)}
+    en_anios = [t for t in range(serie["t_max"], serie["t_min"] - 1, -1)
+                if (not anios or t // 12 in anios) and _tiene_datos(serie, t)]
+    return next((t for t in en_anios if not meses or t % 12 in meses), en_anios[0] if en_anios else None)
+
+def muestra_comparativos(df, version, anios_sel, meses_sel, sucursales_sel):
+    with st.expander("📈 Comparativos en el tiempo", expanded=False):
+        serie = serie_para(version, df)
+        if serie is None:
+            st.caption("La base no tiene Anual/Fecha para armar la serie mensual.")
+            return
+        modo = st.selectbox("Comparación", list(MODOS), format_func=MODOS.get, key="comparativo_modo")
+        ref = mes_referencia(serie, anios_sel, meses_sel)
+        if ref is None:
+            st.caption("Sin datos para los años seleccionados.")
+            return
+        st.caption(f"Mes de referencia: {_etiqueta_mes(ref)} · ACT")
+        if modo == "tendencia":
+            tabla = tendencia(serie, ref, 12, sucursales_sel)
+            st.dataframe(tabla.style.format(precision=0, thousands="."), hide_index=True, width="stretch")
+        else:
+            tabla = comparativo(serie, modo, ref, sucursales_sel)
+            st.dataframe(
+                tabla.style.format({"Actual": "{:,.0f}", "Anterior": "{:,.0f}", "Var": "{:,.0f}", "Var %": "{:.1%}"},
+                                   na_rep=""),
+                hide_index=True, width="stretch",
+            )
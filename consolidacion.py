@@ -0,0 +1,94 @@
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import pnl
+
+# --- consolidación por sucursal en paralelo ---
+CONSOLIDADO = "Consolidado"
+MIN_FILAS_PARALELO = 200_000  # por debajo de esto el pool cuesta más de lo que ahorra
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _pool_procesos():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: Streamlit corre varios hilos y hacer fork con hilos vivos no es seguro
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp.get_context("spawn"))
+        return _pool
+
+def _a_memoria_compartida(df):
+    # cada columna va a un bloque de memoria compartida; las categóricas viajan como códigos
+    descriptor, bloques = {}, []
+    for c in df.columns:
+        serie = df[c]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            arr, extra = serie.cat.codes.to_numpy(), (serie.cat.categories.tolist(), serie.cat.ordered)
+        elif serie.dtype == object:
+            cat = pd.Categorical(serie)
+            arr, extra = cat.codes, (cat.categories.tolist(), False)
+        else:
+            arr, extra = serie.to_numpy(), None
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        bloques.append(shm)
+        descriptor[c] = (shm.name, arr.dtype.str, arr.shape, extra)
+    return descriptor, bloques
+
+def _niveles_de_tramo(descriptor, inicio: int, fin: int):
+    # corre en el worker: arma el tramo [inicio, fin) sobre la memoria compartida
+    bloques, columnas = [], {}
+    try:
+        for c, (nombre, dtype, shape, extra) in descriptor.items():
+            shm = shared_memory.SharedMemory(name=nombre)
+            bloques.append(shm)
+            arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)[inicio:fin]
+            if extra is None:
+                columnas[c] = arr.copy()
+            else:
+                categorias, ordenada = extra
+                columnas[c] = pd.Categorical.from_codes(arr, categories=categorias, ordered=ordenada)
+        return pnl._prepara_niveles(pd.DataFrame(columnas))
+    finally:
+        for shm in bloques:
+            shm.close()
+
+def consolida_sucursales(df, anios_sel=None, periodos_sel=None, meses_sel=None, paralelo=None):
+    # {sucursal: (n0, n1, n2), ..., "Consolidado": (n0, n1, n2)} en una sola llamada
+    df_f = pnl._aplicar_filtros(df, anios_sel, periodos_sel, meses_sel, None)
+    if "Sucursal" not in df_f.columns:
+        return {CONSOLIDADO: pnl._prepara_niveles(df_f.copy())}
+
+    cols = [c for c in ["Cuentas", "SubCuenta"] + pnl.DIMS_TERCER_NIVEL + pnl.MEDIDAS if c in df_f.columns]
+    # las filas sin sucursal quedan al final: entran en el consolidado pero en ningún tramo por sucursal
+    df_f = df_f.sort_values("Sucursal", kind="stable", na_position="last")
+    con_sucursal = int(df_f["Sucursal"].notna().sum())
+    sucursales = df_f["Sucursal"].iloc[:con_sucursal].astype(str).to_numpy()
+    cortes = np.flatnonzero(sucursales[1:] != sucursales[:-1]) + 1
+    inicios = np.concatenate([[0], cortes]).astype(int)
+    fines = np.concatenate([cortes, [con_sucursal]]).astype(int)
+    tramos = [(sucursales[i], int(i), int(f)) for i, f in zip(inicios, fines) if f > i]
+    tramos.append((CONSOLIDADO, 0, len(df_f)))
+
+    datos = df_f[cols].reset_index(drop=True)
+    if paralelo is None:
+        paralelo = len(datos) >= MIN_FILAS_PARALELO and len(tramos) > 2
+    if not paralelo:
+        return {nombre: pnl._prepara_niveles(datos.iloc[i:f].copy()) for nombre, i, f in tramos}
+
+    descriptor, bloques = _a_memoria_compartida(datos)
+    try:
+        pool = _pool_procesos()
+        futuros = {nombre: pool.submit(_niveles_de_tramo, descriptor, i, f) for nombre, i, f in tramos}
+        return {nombre: fut.result() for nombre, fut in futuros.items()}
+    finally:
+        for shm in bloques:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,184 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import pnl
+
+# --- escenarios what-if sobre el PPTO ---
+# la base trae los subtotales como filas propias: al mover el PPTO de una cuenta la diferencia
+# se arrastra a los subtotales que la incluyen, en este orden (cada uno puede usar los anteriores)
+SUBTOTALES = {
+    "Margen": {"Ventas": 1, "Costo": 1},
+    "Contribucion": {"Margen": 1, "Marketing": 1},
+    "Resultado Operativo": {"Contribucion": 1, "Gastos Operativos": 1, "Alquiler": 1, "Mantenimiento": 1,
+                            "Administracion Central": 1, "Royaltie": 1, "Depreciacion": 1},
+    "Resultado Neto": {"Resultado Operativo": 1, "Impuestos a la Renta": 1, "Extraordinário Cash": 1,
+                       "Extraordinário No Cash": 1, "Diferencia Cambiaria": 1, "Provisiones": 1},
+    "EBITDA": {"Resultado Operativo": 1, "Depreciacion": -1},
+}
+KPIS_PPTO = ["pct_p", "pct_ppto", "alc"]  # los únicos KPIs que dependen del PPTO
+BASE = "Base"
+
+def regla(tipo: str, cuentas: str, valor: float, subcuenta=None, linea=None, sucursal=None):
+    # tipo "pct": suma valor% al PPTO; tipo "fijo": deja el PPTO del nodo en valor
+    if tipo not in ("pct", "fijo"):
+        raise ValueError(f"tipo de ajuste desconocido: {tipo}")
+    if cuentas in SUBTOTALES:
+        raise ValueError(f"{cuentas} es un subtotal: se ajusta a través de sus cuentas")
+    return {"tipo": tipo, "cuentas": cuentas, "subcuenta": subcuenta, "linea": linea,
+            "sucursal": sucursal, "valor": float(valor)}
+
+def deltas(df, indice, filtros, reglas):
+    # {(Cuentas, SubCuenta, Linea): delta de PPTO} solo para las hojas que tocan las reglas;
+    # cada regla se calcula sobre el PPTO original y los deltas se suman
+    base = pnl._aplicar_filtros(df, *filtros, indice=indice)
+    third = pnl._third_level_col(base)
+    linea = base[third].astype(str) if third else pd.Series("", index=base.index)
+    sub = base["SubCuenta"].astype(str) if "SubCuenta" in base.columns else pd.Series("", index=base.index)
+    salida = defaultdict(float)
+    for r in reglas:
+        m = (base["Cuentas"] == r["cuentas"]).to_numpy()
+        if r["subcuenta"] is not None:
+            m &= (sub == r["subcuenta"]).to_numpy()
+        if r["linea"] is not None:
+            m &= (linea == r["linea"]).to_numpy()
+        if r["sucursal"] is not None and "Sucursal" in base.columns:
+            m &= (base["Sucursal"] == r["sucursal"]).to_numpy()
+        hojas = base.loc[m, "PPTO"].groupby([sub[m], linea[m]], sort=False).sum()
+
+        if r["tipo"] == "pct":
+            ajuste = hojas * r["valor"] / 100
+        elif hojas.sum():
+            # el nuevo valor se reparte entre las hojas en proporción a su PPTO
+            ajuste = hojas * (r["valor"] / hojas.sum() - 1)
+        else:
+            ajuste = pd.Series({(r["subcuenta"] or "", r["linea"] or ""): r["valor"]})
+        for (s, l), d in ajuste.items():
+            salida[(r["cuentas"], s, l)] += d
+    return {k: d for k, d in salida.items() if d}
+
+def aplica(niveles, deltas_):
+    # n0/n1/n2 con los deltas: se tocan solo las filas afectadas y sus subtotales
+    n0, n1, n2 = (n.copy() for n in niveles)
+    por_nivel = [defaultdict(float), defaultdict(float), defaultdict(float)]
+    for (c, s, l), d in deltas_.items():
+        por_nivel[0][(c,)] += d
+        if s:
+            por_nivel[1][(c, s)] += d
+            if l:
+                por_nivel[2][(c, s, l)] += d
+    for total, partes in SUBTOTALES.items():
+        d = sum(coef * por_nivel[0].get((p,), 0.0) for p, coef in partes.items())
+        if d:
+            por_nivel[0][(total,)] += d
+
+    total_ppto_antes = pnl._total_nivel0(n0, "PPTO")
+    tocadas = []
+    for n, ajustes, claves in zip((n0, n1, n2), por_nivel, (["Cuentas"], ["Cuentas", "SubCuenta"],
+                                                           ["Cuentas", "SubCuenta", "Linea"])):
+        if not ajustes or n.empty:
+            tocadas.append(np.array([], dtype=int))
+            continue
+        pos = {k: i for i, k in enumerate(zip(*(n[c].astype(str) for c in claves)))}
+        filas = np.array([pos[k] for k in ajustes if k in pos], dtype=int)
+        ppto = n["PPTO"].to_numpy(dtype="float64", copy=True)
+        ppto[filas] += [ajustes[k] for k in ajustes if k in pos]
+        n["PPTO"] = ppto
+        tocadas.append(filas)
+
+    # KPIs: si cambió la base de los % se recalcula pct_ppto en todas las filas
+    totales = [pnl._total_nivel0(n0, c) for c in pnl.MEDIDAS]
+    todas = totales[2] != total_ppto_antes
+    for n, filas in zip((n0, n1, n2), tocadas):
+        if n.empty or (not todas and not len(filas)):
+            continue
+        sel = slice(None) if todas else filas
+        act, aa, ppto = (n[c].to_numpy(dtype="float64")[sel] for c in pnl.MEDIDAS)
+        kpis = pnl._kpis(act, aa, ppto, *totales)
+        for k in KPIS_PPTO:
+            valores = n[k].to_numpy(dtype="float64", copy=True)
+            valores[sel] = kpis[k]
+            n[k] = valores
+    return n0, n1, n2
+
+# ---------- escenarios de la sesión ----------
+def _escenarios():
+    return st.session_state.setdefault("escenarios", {})   # nombre -> [reglas]
+
+def activo():
+    # (nombre, reglas) del escenario elegido para la grilla, o None para la base
+    nombre = st.session_state.get("escenario_activo", BASE)
+    reglas = _escenarios().get(nombre)
+    return (nombre, reglas) if reglas else None
+
+def firma(escenario):
+    return None if escenario is None else (escenario[0], repr(escenario[1]))
+
+def niveles_escenario(df, indice, version, filtros, niveles, nombre, reglas):
+    # se guardan varios escenarios a la vez; cada uno se recalcula si cambian datos, filtros o reglas
+    cache = st.session_state.setdefault("_escenarios_cache", {})
+    clave = (version, pnl._firma_filtros(df, *filtros, indice), repr(reglas))
+    entrada = cache.get(nombre)
+    if entrada is None or entrada[0] != clave:
+        entrada = (clave, aplica(niveles, deltas(df, indice, filtros, reglas)))
+        cache[nombre] = entrada
+    return entrada[1]
+
+def _comparacion(df, indice, version, filtros, niveles):
+    n0 = niveles[0]
+    cuentas = [c for c in n0["Cuentas"].astype(str) if c in SUBTOTALES or c == "Ventas"]
+    tabla = {BASE: n0.set_index(n0["Cuentas"].astype(str))["PPTO"].reindex(cuentas)}
+    for nombre, reglas in _escenarios().items():
+        e0 = niveles_escenario(df, indice, version, filtros, niveles, nombre, reglas)[0]
+        tabla[nombre] = e0.set_index(e0["Cuentas"].astype(str))["PPTO"].reindex(cuentas)
+    return pd.DataFrame(tabla).rename_axis("Cuenta").reset_index()
+
+def muestra_escenarios(df, indice, version, filtros, niveles):
+    escenarios = _escenarios()
+    with st.expander("🧪 Escenarios de PPTO", expanded=False):
+        n0, n1 = niveles[0], niveles[1]
+        cuentas = [c for c in n0["Cuentas"].astype(str) if c not in SUBTOTALES]
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            nombre = st.text_input("Escenario", value="Escenario 1", key="esc_nombre").strip()
+            cuenta = st.selectbox("Cuenta", cuentas, key="esc_cuenta")
+        with c2:
+            subs = n1.loc[n1["Cuentas"].astype(str) == cuenta, "SubCuenta"].astype(str).tolist()
+            subcuenta = st.selectbox("SubCuenta", ["(todas)"] + subs, key="esc_subcuenta")
+            sucursales = indice["Sucursal"]["opciones"] if "Sucursal" in indice else []
+            sucursal = st.selectbox("Sucursal", ["(todas)"] + sucursales, key="esc_sucursal")
+        with c3:
+            tipo = st.radio("Ajuste", ["pct", "fijo"], key="esc_tipo",
+                            format_func={"pct": "% sobre PPTO", "fijo": "Fijar PPTO"}.get)
+            valor = st.number_input("Valor", value=5.0 if tipo == "pct" else 0.0, key="esc_valor")
+        with c4:
+            if st.button("Agregar ajuste", key="esc_agregar", width="stretch", disabled=not (nombre and cuenta)):
+                escenarios.setdefault(nombre, []).append(regla(
+                    tipo, cuenta, valor,
+                    subcuenta=None if subcuenta == "(todas)" else subcuenta,
+                    sucursal=None if sucursal == "(todas)" else sucursal,
+                ))
+                st.rerun()
+            # se borra el escenario elegido en "Ver en la grilla", no el del campo de texto
+            elegido = st.session_state.get("escenario_activo", BASE)
+            if escenarios and st.button(f"Borrar {elegido}", key="esc_borrar", width="stretch",
+                                        disabled=elegido not in escenarios):
+                escenarios.pop(elegido, None)
+                st.session_state.get("_escenarios_cache", {}).pop(elegido, None)
+                st.session_state["escenario_activo"] = BASE
+                st.rerun()
+
+        if not escenarios:
+            st.caption("Sin escenarios: agregá un ajuste para compararlo con la base.")
+            return
+        st.selectbox("Ver en la grilla", [BASE] + list(escenarios), key="escenario_activo")
+        for nom, reglas in escenarios.items():
+            st.caption(f"**{nom}**: " + " · ".join(
+                f"{r['cuentas']}{' / ' + r['subcuenta'] if r['subcuenta'] else ''}"
+                f"{' @ ' + str(r['sucursal']) if r['sucursal'] else ''} "
+                + (f"{r['valor']:+g}%" if r["tipo"] == "pct" else f"= {r['valor']:,.0f}")
+                for r in reglas))
+        tabla = _comparacion(df, indice, version, filtros, niveles)
+        st.dataframe(tabla.style.format(precision=0, thousands="."), hide_index=True, width="stretch")
@@ -0,0 +1,110 @@
+import io
+import math
+import re
+
+import pandas as pd
+import streamlit as st
+
+import pnl
+
+# --- exportación del estado de resultados expandido ---
+ENCABEZADO = ["Cuenta", "Nivel", "Cuentas", "SubCuenta", "Linea",
+              "ACT", "% ACT", "AA", "% AA", "VS AA", "%P", "PPTO", "% PPTO", "ALC"]
+_HOJA_INVALIDA = re.compile(r"[\[\]:*?/\\]")
+
+def _filas_estado(niveles):
+    # vista con todos los nodos abribles abiertos, fila por fila
+    arbol = pnl._indexa_arbol(*niveles)
+    for f in pnl._filas_vista(arbol, pnl._nodos_abribles(arbol)):
+        valores = [f[c] for c in pnl.COLS_KPI]
+        yield [f["Cuenta"].strip(" •·"), f["nivel"], f["CuentaKey"], f["SubKey"], f["LineaKey"]] + [
+            None if v is None or (isinstance(v, float) and math.isnan(v)) else float(v) for v in valores
+        ]
+
+def estados_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel):
+    yield "P&L", pnl._prepara_niveles(pnl._aplicar_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel))
+
+def estados_por_sucursal_y_mes(df):
+    # un mes a la vez: nunca hay más de un mes de estados en memoria
+    meses = (df[["Anual", "Fecha"]].dropna().drop_duplicates()
+             .assign(_m=lambda x: pd.Categorical(x["Fecha"].astype(object), categories=pnl.ORDEN_MESES).codes)
+             .sort_values(["Anual", "_m"]))
+    from consolidacion import consolida_sucursales
+    for anio, mes in zip(meses["Anual"], meses["Fecha"]):
+        etiqueta = f"{str(mes)[:3]}-{str(anio)[-2:]}"
+        for nombre, niveles in consolida_sucursales(df, [anio], None, [mes]).items():
+            yield f"{nombre} {etiqueta}", niveles
+
+def _nombre_hoja(nombre: str, usados: set) -> str:
+    base = _HOJA_INVALIDA.sub("-", nombre)[:31] or "Hoja"
+    hoja, i = base, 2
+    while hoja.lower() in usados:
+        sufijo = f" ({i})"
+        hoja, i = base[:31 - len(sufijo)] + sufijo, i + 1
+    usados.add(hoja.lower())
+    return hoja
+
+def exporta_excel(estados, destino):
+    from openpyxl import Workbook
+    # write_only: las filas se vuelcan a disco a medida que se agregan, no se arma el libro en memoria
+    wb = Workbook(write_only=True)
+    usados = set()
+    for nombre, niveles in estados:
+        ws = wb.create_sheet(title=_nombre_hoja(nombre, usados))
+        ws.column_dimensions["A"].width = 40
+        ws.append(ENCABEZADO)
+        for fila in _filas_estado(niveles):
+            ws.append(fila)
+    if not usados:
+        wb.create_sheet(title="P&L").append(ENCABEZADO)
+    wb.save(destino)
+
+def exporta_csv(estados, destino):
+    # un bloque por estado, con separador ; y coma decimal (Excel en español)
+    primero = True
+    for nombre, niveles in estados:
+        bloque = pd.DataFrame(_filas_estado(niveles), columns=ENCABEZADO)
+        bloque.insert(0, "Estado", nombre)
+        bloque.to_csv(destino, sep=";", decimal=",", index=False, header=primero)
+        primero = False
+    if primero:
+        destino.write(";".join(["Estado"] + ENCABEZADO) + "\n")
+
+def muestra_exportacion(df, anios_sel, periodos_sel, meses_sel, sucursales_sel, version=None):
+    with st.expander("⬇️ Exportar", expanded=False):
+        c1, c2, c3 = st.columns([2, 1, 1])
+        with c1:
+            alcance = st.radio("Alcance", ["Filtros actuales", "Cada sucursal y mes"], horizontal=True, key="export_alcance")
+        with c2:
+            formato = st.radio("Formato", ["Excel", "CSV"], horizontal=True, key="export_formato")
+        with c3:
+            generar = st.button("Generar", key="export_generar", width="stretch")
+
+        # lo que define el contenido del archivo: si cambia, la exportación guardada ya no vale
+        firma = (version, alcance, pnl._firma_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel)
+                 if alcance == "Filtros actuales" else None)
+
+        if generar:
+            if alcance == "Filtros actuales":
+                estados = estados_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel)
+            else:
+                estados = estados_por_sucursal_y_mes(df)
+            with st.spinner("Generando exportación..."):
+                if formato == "Excel":
+                    buf = io.BytesIO()
+                    exporta_excel(estados, buf)
+                    datos, nombre, mime = buf.getvalue(), "estado_resultados.xlsx", \
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                else:
+                    buf = io.StringIO()
+                    exporta_csv(estados, buf)
+                    datos, nombre, mime = buf.getvalue().encode("utf-8-sig"), "estado_resultados.csv", "text/csv"
+            st.session_state["_exportacion"] = (firma, datos, nombre, mime)
+
+        if "_exportacion" in st.session_state:
+            firma_export, datos, nombre, mime = st.session_state["_exportacion"]
+            if firma_export != firma:
+                del st.session_state["_exportacion"]
+                st.caption("Cambiaron los filtros, el alcance o los datos: generá la exportación de nuevo.")
+            else:
+                st.download_button(f"Descargar {nombre}", datos, file_name=nombre, mime=mime, key="export_descargar")
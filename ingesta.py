@@ -0,0 +1,115 @@
+import os
+import threading
+import pandas as pd
+
+import pnl
+
+# --- ingesta por bloques de una carpeta de exportaciones mensuales ---
+EXTENSIONES = (".xlsx", ".csv")
+FILAS_POR_BLOQUE = 50_000
+
+_archivos = {}   # ruta -> ((mtime, tamaño), cubo parcial del archivo)
+_archivos_lock = threading.Lock()
+
+def archivos_fuente(directorio: str):
+    return sorted(
+        os.path.join(directorio, f) for f in os.listdir(directorio)
+        if f.lower().endswith(EXTENSIONES) and not f.startswith(("~$", "."))
+    )
+
+def firma_directorio(directorio: str):
+    firma = []
+    for ruta in archivos_fuente(directorio):
+        info = os.stat(ruta)
+        firma.append((os.path.basename(ruta), info.st_mtime, info.st_size))
+    return tuple(firma)
+
+def _bloques_xlsx(ruta: str, filas: int):
+    from openpyxl import load_workbook
+    # read_only: openpyxl recorre la hoja en streaming sin armar el modelo completo del libro
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        ws = wb["datos"] if "datos" in wb.sheetnames else wb.worksheets[0]
+        it = ws.iter_rows(values_only=True)
+        encabezado = [str(c).strip() if c is not None else f"col_{i}" for i, c in enumerate(next(it, ()))]
+        lote = []
+        for fila in it:
+            if all(v is None for v in fila):
+                continue
+            lote.append(fila[:len(encabezado)])
+            if len(lote) >= filas:
+                yield pd.DataFrame(lote, columns=encabezado)
+                lote = []
+        if lote:
+            yield pd.DataFrame(lote, columns=encabezado)
+    finally:
+        wb.close()
+
+def _bloques_csv(ruta: str, filas: int):
+    with open(ruta, encoding="utf-8-sig", errors="replace") as fh:
+        primera = fh.readline()
+    # exportación regional (;) trae coma decimal y punto de miles
+    if primera.count(";") > primera.count(","):
+        opciones = {"sep": ";", "decimal": ",", "thousands": "."}
+    else:
+        opciones = {"sep": ","}
+    yield from pd.read_csv(ruta, chunksize=filas, encoding="utf-8-sig", **opciones)
+
+def _bloques(ruta: str, filas: int = FILAS_POR_BLOQUE):
+    if ruta.lower().endswith(".csv"):
+        return _bloques_csv(ruta, filas)
+    return _bloques_xlsx(ruta, filas)
+
+def _cubo_archivo(ruta: str):
+    # cada bloque se normaliza y se pliega en el cubo del archivo: en memoria
+    # nunca hay más que un bloque crudo más el cubo acumulado
+    cubo = None
+    for bloque in _bloques(ruta):
+        parcial = pnl._construye_cubo(pnl._normaliza_dimensiones(pnl._normaliza_importes(bloque)))
+        cubo = parcial if cubo is None else pnl._construye_cubo(pd.concat([cubo, parcial], ignore_index=True))
+    return cubo
+
+def _cubo_archivo_cacheado(ruta: str, firma):
+    snap = pnl._ruta_snapshot(ruta, firma[0], sufijo=".cubo")
+    if os.path.exists(snap):
+        try:
+            return pnl._leer_snapshot(snap)
+        except Exception:
+            pass
+    cubo = _cubo_archivo(ruta)
+    if cubo is not None:
+        try:
+            pnl._escribir_snapshot(cubo, snap)
+        except Exception:
+            pass  # el snapshot es solo una optimización
+    return cubo
+
+def cubo_directorio(directorio: str):
+    rutas = archivos_fuente(directorio)
+    parciales = []
+    for ruta in rutas:
+        info = os.stat(ruta)
+        firma = (info.st_mtime, info.st_size)
+        with _archivos_lock:
+            previo = _archivos.get(ruta)
+        if previo is not None and previo[0] == firma:
+            cubo = previo[1]  # archivo sin cambios: no se vuelve a leer
+        else:
+            cubo = _cubo_archivo_cacheado(ruta, firma)
+            with _archivos_lock:
+                _archivos[ruta] = (firma, cubo)
+        if cubo is not None:
+            parciales.append(cubo)
+
+    with _archivos_lock:
+        for ruta in set(_archivos).difference(rutas):
+            del _archivos[ruta]  # archivos borrados de la carpeta
+
+    if not parciales:
+        raise ValueError(f"no hay archivos {'/'.join(EXTENSIONES)} con datos en {directorio}")
+    # los parciales tienen categorías distintas: se normaliza de nuevo sobre el cubo combinado
+    combinado = pd.concat(parciales, ignore_index=True)
+    for c in combinado.columns:
+        if isinstance(combinado[c].dtype, pd.CategoricalDtype):
+            combinado[c] = combinado[c].astype(object)
+    return pnl._construye_cubo(pnl._normaliza_dimensiones(combinado))
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger("pnl.metricas")
+
+# --- exportación opcional (variables de entorno) ---
+ARCHIVO_PROMETHEUS = os.environ.get("PNL_METRICAS_ARCHIVO")   # se reescribe al final de cada rerun
+PUERTO_PROMETHEUS = os.environ.get("PNL_METRICAS_PUERTO")     # sirve GET /metrics en 127.0.0.1
+LOG_METRICAS = os.environ.get("PNL_METRICAS_LOG")             # "stderr" o ruta: una línea JSON por rerun
+
+_local = threading.local()      # Streamlit corre cada sesión en su propio hilo
+_acumulado = {}                 # etapa -> {"n", "seg_total", "seg", "filas", "bytes"}
+_valores = {}                   # gauges sueltos (ej. estado de la caché de niveles)
+_lock = threading.Lock()
+_servidor = None
+
+# Streamlit solo configura su propio logger: sin un handler acá las líneas INFO no salen
+if LOG_METRICAS and not log.handlers:
+    _handler = logging.StreamHandler() if LOG_METRICAS == "stderr" else logging.FileHandler(LOG_METRICAS, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+def inicia_corrida():
+    _local.corrida = []
+    _local.pila = []
+    _local.ultima = None
+
+@contextmanager
+def etapa(nombre: str):
+    # las etapas se anidan (ej. "filtros" dentro de "niveles"): cada una guarda a su padre
+    # y solo las de primer nivel suman al total de la corrida
+    pila = getattr(_local, "pila", None)
+    if pila is None:
+        pila = _local.pila = []
+    reg = {"etapa": nombre, "padre": pila[-1]["etapa"] if pila else None, "seg": 0.0, "filas": None, "bytes": None}
+    corrida = getattr(_local, "corrida", None)
+    if corrida is not None:
+        corrida.append(reg)  # al entrar: el padre queda antes que sus hijas
+    pila.append(reg)
+    t0 = time.perf_counter()
+    try:
+        yield reg
+    finally:
+        reg["seg"] = time.perf_counter() - t0
+        pila.pop()
+
+def total_corrida(corrida) -> float:
+    return sum(r["seg"] for r in corrida if r["padre"] is None)
+
+def registra_df(reg, *dfs):
+    reg["filas"] = int(sum(len(df) for df in dfs))
+    reg["bytes"] = int(sum(df.memory_usage(deep=True).sum() for df in dfs))
+
+def fija(nombre: str, valor):
+    with _lock:
+        _valores[nombre] = valor
+
+def cierra_corrida():
+    corrida = getattr(_local, "corrida", None)
+    if corrida is None:
+        return []
+    _local.corrida, _local.ultima = None, corrida
+
+    with _lock:
+        for reg in corrida:
+            acc = _acumulado.setdefault(reg["etapa"], {"n": 0, "seg_total": 0.0})
+            acc["n"] += 1
+            acc["seg_total"] += reg["seg"]
+            acc.update(seg=reg["seg"], filas=reg["filas"], bytes=reg["bytes"])
+
+    log.info(json.dumps({"evento": "pnl_rerun", "seg_total": total_corrida(corrida), "etapas": corrida}))
+    if ARCHIVO_PROMETHEUS:
+        tmp = f"{ARCHIVO_PROMETHEUS}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(texto_prometheus())
+        os.replace(tmp, ARCHIVO_PROMETHEUS)
+    return corrida
+
+def ultima_corrida():
+    return getattr(_local, "ultima", None) or []
+
+def texto_prometheus() -> str:
+    with _lock:
+        acumulado = {k: dict(v) for k, v in _acumulado.items()}
+        valores = dict(_valores)
+
+    lineas = []
+    def serie(nombre, tipo, ayuda, campo):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for et, acc in sorted(acumulado.items()):
+            if acc.get(campo) is not None:
+                lineas.append(f'{nombre}{{etapa="{et}"}} {acc[campo]}')
+
+    serie("pnl_etapa_ejecuciones_total", "counter", "Veces que se ejecutó la etapa.", "n")
+    serie("pnl_etapa_segundos_total", "counter", "Tiempo acumulado de la etapa.", "seg_total")
+    serie("pnl_etapa_ultima_segundos", "gauge", "Duración de la última ejecución.", "seg")
+    serie("pnl_etapa_ultima_filas", "gauge", "Filas producidas en la última ejecución.", "filas")
+    serie("pnl_etapa_ultima_bytes", "gauge", "Memoria del DataFrame producido en la última ejecución.", "bytes")
+    for nombre, valor in sorted(valores.items()):
+        lineas.append(f"# TYPE {nombre} gauge")
+        lineas.append(f"{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+def inicia_servidor(puerto=PUERTO_PROMETHEUS):
+    global _servidor
+    if not puerto:
+        return None
+    with _lock:
+        if _servidor is None:
+            try:
+                _servidor = ThreadingHTTPServer(("127.0.0.1", int(puerto)), _Handler)
+            except OSError as e:
+                log.warning("no se pudo abrir el puerto de métricas %s: %s", puerto, e)
+                return None
+            threading.Thread(target=_servidor.serve_forever, name="pnl-metricas", daemon=True).start()
+    return _servidor
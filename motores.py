@@ -0,0 +1,140 @@
+import importlib
+import logging
+import threading
+
+import pandas as pd
+
+import pnl
+
+log = logging.getLogger("pnl.motores")
+
+# --- motores de agregación: filtran el cubo y devuelven n0/n1/n2 ---
+# pandas es la referencia (_aplicar_filtros + _prepara_niveles); duckdb y polars son opcionales
+# y resuelven filtros y sumas en paralelo sobre una tabla Arrow del cubo
+MOTORES = ("pandas", "duckdb", "polars")
+
+_tablas = {}   # versión de la base -> tabla Arrow del cubo; se guardan solo las últimas
+_tablas_lock = threading.Lock()
+_faltantes = set()
+
+def disponible(motor: str) -> bool:
+    if motor == "pandas":
+        return True
+    if motor not in MOTORES:
+        raise ValueError(f"motor desconocido: {motor}")
+    if motor in _faltantes:
+        return False
+    try:
+        importlib.import_module(motor)
+        return True
+    except ImportError:
+        log.warning("el motor %s no está instalado; se usa pandas", motor)
+        _faltantes.add(motor)
+        return False
+
+def _tabla(version, cubo):
+    with _tablas_lock:
+        tabla = _tablas.get(version)
+    if tabla is None:
+        import pyarrow as pa
+        # las categóricas pasan como columnas diccionario: los motores filtran y agrupan sobre códigos
+        tabla = pa.Table.from_pandas(cubo, preserve_index=False)
+        with _tablas_lock:
+            _tablas[version] = tabla
+            for v in list(_tablas)[:-2]:
+                del _tablas[v]
+    return tabla
+
+def _bases_duckdb(tabla, filtros, candidatos):
+    import duckdb
+    # una sola consulta: cada nivel (y cada candidato a tercer nivel) es un grouping set;
+    # el conjunto vacío trae, además, qué candidatos tienen valores en las filas filtradas
+    claves = ["Cuentas", "SubCuenta"] + candidatos
+    q = lambda c: f'"{c}"'
+    no_vacio = lambda c: f"({q(c)} IS NOT NULL AND CAST({q(c)} AS VARCHAR) <> '')"
+    conjuntos = [[], ["Cuentas"], ["Cuentas", "SubCuenta"]] + [["Cuentas", "SubCuenta", c] for c in candidatos]
+    donde = " AND ".join(f"list_contains(?, CAST({q(c)} AS VARCHAR))" for c, _ in filtros) or "TRUE"
+    sql = f"""
+        SELECT GROUPING({", ".join(map(q, claves))}) AS _conjunto, {", ".join(map(q, claves))},
+               {", ".join(f"sum({q(m)}) AS {q(m)}" for m in pnl.MEDIDAS)},
+               {", ".join(f"bool_or({no_vacio(c)}) AS {q('_hay_' + c)}" for c in candidatos) or "NULL AS _nada"}
+        FROM cubo
+        WHERE {donde}
+        GROUP BY GROUPING SETS ({", ".join("(" + ", ".join(map(q, cs)) + ")" for cs in conjuntos)})
+    """
+    con = duckdb.connect()
+    try:
+        con.register("cubo", tabla)
+        res = con.execute(sql, [valores for _, valores in filtros]).df()
+    finally:
+        con.close()
+
+    # GROUPING(...) prende un bit por cada clave que no está en el conjunto
+    bits = lambda cs: sum(1 << (len(claves) - 1 - i) for i, c in enumerate(claves) if c not in cs)
+    de = lambda cs: res[res["_conjunto"] == bits(cs)]
+    total = de([])
+    hay = {c: bool(total[f"_hay_{c}"].fillna(False).any()) for c in candidatos}
+
+    niv0 = de(["Cuentas"])
+    niv1 = de(["Cuentas", "SubCuenta"])
+    niv1 = niv1[niv1["SubCuenta"].astype(str) != ""]
+    third = next((c for c in candidatos if hay[c]), None)
+    niv2 = None
+    if third:
+        niv2 = de(["Cuentas", "SubCuenta", third])
+        niv2 = niv2[(niv2["SubCuenta"].astype(str) != "") & (niv2[third].astype(str) != "")]
+    return niv0, niv1, niv2, third
+
+def _bases_polars(tabla, filtros, candidatos):
+    import polars as pl
+    texto = lambda c: pl.col(c).cast(pl.Utf8)
+    lf = pl.from_arrow(tabla).lazy()
+    for c, valores in filtros:
+        lf = lf.filter(texto(c).is_in(valores))
+    sumas = [pl.col(m).sum() for m in pnl.MEDIDAS]
+    con_sub = lf.filter(texto("SubCuenta") != "")
+
+    consultas = [
+        lf.select([(texto(c).fill_null("") != "").any().alias(c) for c in candidatos] or [pl.lit(None).alias("_nada")]),
+        lf.group_by("Cuentas").agg(sumas),
+        con_sub.group_by(["Cuentas", "SubCuenta"]).agg(sumas),
+    ] + [con_sub.filter(texto(c) != "").group_by(["Cuentas", "SubCuenta", c]).agg(sumas) for c in candidatos]
+    # collect_all corre todas las agrupaciones en paralelo y comparte el filtrado
+    hay, niv0, niv1, *niv2s = [r.to_pandas() for r in pl.collect_all(consultas)]
+
+    third = next((c for c in candidatos if bool(hay[c].fillna(False).any())), None)
+    niv2 = niv2s[candidatos.index(third)] if third else None
+    return niv0, niv1, niv2, third
+
+_BASES = {"duckdb": _bases_duckdb, "polars": _bases_polars}
+
+def _a_pandas(base, cubo, claves, columnas):
+    # mismas categóricas que el cubo y mismo orden que el groupby de pandas
+    base = base.dropna(subset=claves)
+    out = pd.DataFrame({
+        c: pd.Categorical(base[c].astype(object).to_numpy(), dtype=cubo[c].dtype) for c in claves
+    })
+    for m in pnl.MEDIDAS:
+        out[m] = base[m].to_numpy(dtype="float64")
+    out.columns = columnas
+    return out.sort_values(columnas[:len(claves)], kind="stable").reset_index(drop=True)
+
+def niveles(motor, df, version, anios_sel, periodos_sel, meses_sel, sucursales_sel):
+    if motor == "pandas":
+        return pnl._prepara_niveles(pnl._aplicar_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel))
+
+    firma = pnl._firma_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel)
+    filtros = [(c, sorted(str(v) for v in sel)) for c, sel in zip(pnl.DIMS_FILTRO, firma) if sel is not None]
+    candidatos = [c for c in pnl.DIMS_TERCER_NIVEL if c in df.columns]
+    for c in ["Cuentas", "SubCuenta"]:
+        if c not in df.columns:
+            df = df.assign(**{c: pd.Categorical([""] * len(df))})
+
+    niv0, niv1, niv2, third = _BASES[motor](_tabla(version, df), filtros, candidatos)
+    niv0 = _a_pandas(niv0, df, ["Cuentas"], ["Cuentas"] + pnl.MEDIDAS)
+    niv1 = _a_pandas(niv1, df, ["Cuentas", "SubCuenta"], ["Cuentas", "SubCuenta"] + pnl.MEDIDAS)
+    if third:
+        niv2 = _a_pandas(niv2, df, ["Cuentas", "SubCuenta", third], ["Cuentas", "SubCuenta", "Linea"] + pnl.MEDIDAS)
+    else:
+        niv2 = pd.DataFrame(columns=["Cuentas", "SubCuenta", "Linea"] + pnl.MEDIDAS)
+    return pnl._completa_niveles(niv0, niv1, niv2)
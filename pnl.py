@@ -1,10 +1,42 @@
 import os
+import re
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 import streamlit as st
+import numpy as np
 import pandas as pd
-from st_aggrid import GridOptionsBuilder, AgGrid, JsCode
+from st_aggrid import GridOptionsBuilder, AgGrid, JsCode, GridUpdateMode
+
+import metricas
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ARCHIVO = os.path.join(BASE_DIR, "base.xlsx")  # <- ahora lee desde la raíz
+FUENTE = os.environ.get("PNL_FUENTE", ARCHIVO)  # base.xlsx o una carpeta con exportaciones mensuales (XLSX/CSV)
+CACHE_DIR = os.path.join(BASE_DIR, ".cache_pnl")  # snapshots columnares (Arrow IPC) de la base
+SNAPSHOT_VERSION = 2  # subir si cambia la normalización de _parsear_excel
+
+# --- orden fijo de las dimensiones ---
+ORDEN_CUENTAS = [
+    "Ventas","Costo","Margen","Marketing","Contribucion",
+    "Gastos Operativos","Alquiler","Mantenimiento","Administracion Central",
+    "Royaltie","Depreciacion","Resultado Operativo","Impuestos a la Renta",
+    "Extraordinário Cash","Extraordinário No Cash","Diferencia Cambiaria",
+    "Provisiones","Resultado Neto","Flujo","EBITDA","F-Flujo"
+]
+ORDEN_MESES = ["Enero","Febrero","Marzo","Abril","Mayo","Junio","Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"]
+
+# --- cubo pre-agregado ---
+DIMS_FILTRO = ["Anual", "Periodo", "Fecha", "Sucursal"]
+DIMS_TERCER_NIVEL = ["Linea", "Tipo", "Detalle", "SubSubCuenta"]  # mismos candidatos que _third_level_col
+MEDIDAS = ["ACT", "AA", "PPTO"]
+
+# --- caché compartida de niveles (todas las sesiones del proceso) ---
+CACHE_NIVELES_MAX_BYTES = 256 * 1024 * 1024
+_cache_niveles = OrderedDict()   # (version, firma) -> (bytes, (n0, n1, n2)), en orden LRU
+_cache_niveles_lock = threading.Lock()
+_cache_niveles_stats = {"hits": 0, "misses": 0, "bytes": 0}
 
 # --- reglas de expansión ---
 NO_EXPAND_N0 = {"Ventas","Margen","Contribucion","Administracion Central","Royaltie","Resultado Operativo","Impuesto a la Renta","Diferencia Cambiaria","Resultado Neto",
@@ -14,13 +46,17 @@ N2_ALLOWED_FOR_N1 = {                               # n1 que sí puede abrir n2
     ("Gastos Operativos", "Gastos Generales"),
     ("Gastos Operativos", "Gastos Personal"),
 }
+EXPANSION_EN_CLIENTE = True  # True: el árbol se abre/cierra en el navegador, sin rerun de Streamlit
+PAYLOAD_COMPACTO = True      # True: a la grilla solo viajan columnas visibles, ids enteros y números redondeados
+DECIMALES_RATIO = 4          # los % se muestran con 1 decimal (x100): 4 decimales alcanzan
+MOTOR = os.environ.get("PNL_MOTOR", "pandas")  # pandas | duckdb | polars: quién filtra y agrupa los niveles
 
 # --- Estilos globales para celdas (usados en _grid_format) ---
 totalizer_cellstyle = JsCode("""
 function(params){
     var d = params.data || {};
     var cta = (d.Cuenta || '').toString().trim().toLowerCase();
-    var isTotal = (d.Nodo === 'n0') && (
+    var isTotal = (d.nivel === 0) && (
         cta === 'ventas' ||
         cta === 'margen' ||
         cta === 'contribucion' ||
@@ -47,7 +83,7 @@ function(params){
     var style = {};
     if (d && (d.nivel === 0 || d.nivel === 1)){ style.cursor = 'pointer'; }
     var cta = (d.Cuenta || '').toString().trim().toLowerCase();
-    var isTotal = (d.Nodo === 'n0') && (
+    var isTotal = (d.nivel === 0) && (
         cta === 'ventas' ||
         cta === 'margen' ||
         cta === 'contribucion' ||
@@ -63,6 +99,45 @@ function(params){
 }
 """)
 
+# --- expansión del árbol en el navegador (modo EXPANSION_EN_CLIENTE) ---
+tree_row_id = JsCode("function(params){ return String(params.data.id); }")
+
+tree_filter_present = JsCode("function(){ return true; }")
+
+tree_filter_pass = JsCode("""
+function(node){
+    return !!(node.data && node.data.visible);
+}
+""")
+
+tree_toggle = JsCode("""
+function(params){
+    var d = params.data;
+    if (!d || !d.expandible) return;
+    d.abierto = d.abierto ? 0 : 1;
+    var abiertos = {};
+    params.api.forEachNode(function(n){
+        if (n.data && n.data.abierto){ abiertos[n.data.id] = true; }
+    });
+    params.api.forEachNode(function(n){
+        var x = n.data;
+        if (!x) return;
+        x.visible = (x.padre < 0 || abiertos[x.padre]) && (x.abuelo < 0 || abiertos[x.abuelo]) ? 1 : 0;
+    });
+    params.api.onFilterChanged();
+    params.api.refreshCells({rowNodes: [params.node], columns: ['Cuenta'], force: true});
+}
+""")
+
+tree_cuenta_fmt = JsCode("""
+function(params){
+    var d = params.data || {};
+    var v = (params.value === null || params.value === undefined) ? '' : params.value;
+    if (!d.expandible) return v;
+    return (d.abierto ? '▾ ' : '▸ ') + v;
+}
+""")
+
 # ---------- utils ----------
 def rerun_app():
     try:
@@ -74,10 +149,13 @@ def rerun_app():
             pass
 
 def _third_level_col(df: pd.DataFrame):
-    candidatos = ["Linea", "Tipo", "Detalle", "SubSubCuenta"]
-    for c in candidatos:
+    for c in DIMS_TERCER_NIVEL:
         if c in df.columns:
-            if df[c].astype(str).str.strip().ne("").any():
+            col = df[c]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                if (col.notna() & (col != "")).any():
+                    return c
+            elif col.astype(str).str.strip().ne("").any():
                 return c
     return None
 
@@ -95,13 +173,7 @@ def _norm(s: str) -> str:
         return ""
     return str(s).strip().lower()
 
-@st.cache_data
-def cargar_datos(path: str, mtime: float):
-    try:
-        df = pd.read_excel(path, sheet_name="datos")
-    except ValueError:
-        df = pd.read_excel(path)  # fallback a primera hoja
-
+def _normaliza_importes(df):
     for col in ["ACT", "AA", "PPTO"]:
         if df.get(col) is not None and df[col].dtype == "object":
             df[col] = (
@@ -115,11 +187,221 @@ def cargar_datos(path: str, mtime: float):
     for c in ["Cuentas", "SubCuenta", "Tipo"]:
         if c not in df.columns:
             df[c] = ""
+    return df
+
+def _parsear_excel(path: str):
+    try:
+        df = pd.read_excel(path, sheet_name="datos")
+    except ValueError:
+        df = pd.read_excel(path)  # fallback a primera hoja
 
-    df["Cuentas"]   = df["Cuentas"].fillna("").astype(str)
-    df["SubCuenta"] = df["SubCuenta"].fillna("").astype(str)
+    return _normaliza_dimensiones(_normaliza_importes(df))
+
+def _como_categoria(serie, orden=None, vacio=""):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    valores = serie.astype(object).where(serie.isna(), serie.astype(str).str.strip())
+    if vacio is not None:
+        valores = valores.fillna(vacio)
+    presentes = set(valores.dropna().unique().tolist())
+    primero = [v for v in (orden or []) if v in presentes]
+    resto = sorted(presentes.difference(primero))
+    return pd.Categorical(valores, categories=primero + resto, ordered=True)
+
+def _normaliza_dimensiones(df):
+    # se hace una sola vez al cargar: después los filtros y groupby trabajan sobre códigos enteros
+    df["Cuentas"]   = _como_categoria(df["Cuentas"], ORDEN_CUENTAS)
+    df["SubCuenta"] = _como_categoria(df["SubCuenta"])
+    for c in DIMS_TERCER_NIVEL:
+        if c in df.columns:
+            df[c] = _como_categoria(df[c])
+    # Sucursal/Fecha conservan los nulos: no deben aparecer como opción de filtro
+    if "Sucursal" in df.columns:
+        df["Sucursal"] = _como_categoria(df["Sucursal"], vacio=None)
+    if "Fecha" in df.columns:
+        df["Fecha"] = _como_categoria(df["Fecha"], ORDEN_MESES, vacio=None)
     return df
 
+# ---------- snapshot columnar (Arrow IPC) ----------
+def _hash_archivo(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for bloque in iter(lambda: fh.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+_PATRON_SNAPSHOT = re.compile(r"(?P<prefijo>.+)-v\d+-\d+-[0-9a-f]{16}\.arrow")
+
+def _ruta_snapshot(path: str, mtime: float, sufijo: str = "") -> str:
+    # el prefijo lleva un hash de la ruta completa: dos carpetas con los mismos nombres de archivo
+    # no comparten (ni se borran) snapshots
+    ruta = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    nombre = os.path.splitext(os.path.basename(path))[0] + sufijo + f"-{ruta}"
+    clave = f"v{SNAPSHOT_VERSION}-{int(mtime)}-{_hash_archivo(path)}"
+    return os.path.join(CACHE_DIR, f"{nombre}-{clave}.arrow")
+
+def _leer_snapshot(ruta: str):
+    import pyarrow as pa
+    # sin compresión: el archivo se mapea en memoria en vez de leerse a un buffer intermedio;
+    # to_pandas igual copia las columnas a los bloques de pandas
+    with pa.memory_map(ruta, "r") as fuente:
+        tabla = pa.ipc.open_file(fuente).read_all()
+    return tabla.to_pandas()
+
+def _escribir_snapshot(df, ruta: str):
+    import pyarrow as pa
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+    os.replace(tmp, ruta)  # atómico: otro worker nunca ve un snapshot a medio escribir
+
+    # borra snapshots viejos del mismo archivo (mismo prefijo exacto, otra versión/mtime/hash)
+    prefijo = _PATRON_SNAPSHOT.fullmatch(os.path.basename(ruta)).group("prefijo")
+    for f in os.listdir(CACHE_DIR):
+        viejo = _PATRON_SNAPSHOT.fullmatch(f)
+        if viejo and viejo.group("prefijo") == prefijo and f != os.path.basename(ruta):
+            try:
+                os.remove(os.path.join(CACHE_DIR, f))
+            except OSError:
+                pass
+
+def _cargar_base(path: str, mtime: float):
+    ruta = _ruta_snapshot(path, mtime)
+    if os.path.exists(ruta):
+        try:
+            return _leer_snapshot(ruta)
+        except Exception:
+            pass  # snapshot corrupto o pyarrow ausente -> se reparsea el Excel
+
+    df = _parsear_excel(path)
+    try:
+        _escribir_snapshot(df, ruta)
+    except Exception:
+        pass  # el snapshot es solo una optimización
+    return df
+
+def _construye_cubo(df):
+    # una celda por combinación de dimensiones: filtrar y agrupar sobre el cubo
+    # da los mismos totales que sobre las filas crudas del mayor
+    dims = [c for c in DIMS_FILTRO + ["Cuentas", "SubCuenta"] + DIMS_TERCER_NIVEL if c in df.columns]
+    medidas = [c for c in MEDIDAS if c in df.columns]
+    return df.groupby(dims, as_index=False, sort=False, dropna=False, observed=True)[medidas].sum()
+
+def _construye_indice(df):
+    # por dimensión de filtro: opciones ya ordenadas para los checklists y una máscara booleana
+    # por valor; una selección se resuelve con OR/AND de máscaras, sin recorrer las columnas
+    indice = {}
+    for col in DIMS_FILTRO:
+        if col not in df.columns:
+            continue
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories.tolist()
+        else:
+            codigos, valores = pd.factorize(serie, sort=True)
+            valores = valores.tolist()
+        presentes = np.unique(codigos[codigos >= 0])
+        mascaras = {valores[k]: codigos == k for k in presentes}
+        if col == "Fecha":
+            opciones = [m for m in ORDEN_MESES if m in mascaras]
+        else:
+            opciones = sorted(mascaras)
+        indice[col] = {"opciones": opciones, "mascaras": mascaras}
+    return indice
+
+# ---------- recarga de la base en segundo plano ----------
+VIGILANCIA_SEG = 2.0  # cada cuánto se revisa el archivo; también es la ventana de debounce
+_datasets = {}        # path -> {"version": firma de la fuente, "df": cubo, "indice": máscaras por filtro, "error": str|None}
+_datasets_lock = threading.Lock()
+_cargas = {}          # path -> lock de la primera carga: quien llega mientras otro carga, espera
+_vigilantes = {}      # path -> hilo que vigila el archivo
+
+def _valida_base(df):
+    faltan = [c for c in ["Cuentas", "ACT"] if c not in df.columns]
+    if faltan:
+        raise ValueError(f"faltan columnas: {', '.join(faltan)}")
+    if df.empty:
+        raise ValueError("la hoja no tiene filas")
+    # _normaliza_importes completa Cuentas con "" si falta: una base sin ninguna cuenta no es válida
+    if (df["Cuentas"].astype(str).str.strip() == "").all():
+        raise ValueError("la columna Cuentas falta o está vacía")
+
+def _firma_fuente(path: str):
+    if os.path.isdir(path):
+        from ingesta import firma_directorio
+        return firma_directorio(path)
+    info = os.stat(path)
+    return (info.st_mtime, info.st_size)
+
+def _carga_version(path: str, firma):
+    if os.path.isdir(path):
+        from ingesta import cubo_directorio
+        cubo = cubo_directorio(path)
+    else:
+        cubo = _construye_cubo(_cargar_base(path, firma[0]))
+    _valida_base(cubo)
+    return {"version": firma, "df": cubo, "indice": _construye_indice(cubo), "error": None}
+
+def _vigila_archivo(path: str):
+    anterior, fallida = None, None
+    while True:
+        time.sleep(VIGILANCIA_SEG)
+        try:
+            actual = _firma_fuente(path)
+        except OSError:
+            anterior = None  # se está reemplazando el archivo
+            continue
+
+        with _datasets_lock:
+            vigente = _datasets.get(path)
+        if vigente is not None and actual == vigente["version"]:
+            anterior = actual
+            continue
+        if actual != anterior:
+            anterior = actual  # todavía se está escribiendo: esperar una vuelta sin cambios
+            continue
+        if actual == fallida:
+            continue
+
+        try:
+            nuevo = _carga_version(path, actual)
+        except Exception as e:
+            fallida = actual
+            with _datasets_lock:
+                if path in _datasets:
+                    _datasets[path] = {**_datasets[path], "error": f"{type(e).__name__}: {e}"}
+            continue
+        with _datasets_lock:
+            _datasets[path] = nuevo  # swap atómico: las sesiones siguen con la versión anterior hasta acá
+
+def _asegura_vigilante(path: str):
+    with _datasets_lock:
+        hilo = _vigilantes.get(path)
+        if hilo is None or not hilo.is_alive():
+            hilo = threading.Thread(target=_vigila_archivo, args=(path,), name=f"pnl-vigila-{os.path.basename(path)}", daemon=True)
+            _vigilantes[path] = hilo
+            hilo.start()
+
+def dataset_actual(path: str = FUENTE):
+    with _datasets_lock:
+        datos = _datasets.get(path)
+    if datos is None:
+        # solo la primera carga del proceso bloquea; las siguientes las hace el vigilante
+        with _datasets_lock:
+            carga = _cargas.setdefault(path, threading.Lock())
+        with carga:
+            with _datasets_lock:
+                datos = _datasets.get(path)
+            if datos is None:
+                datos = _carga_version(path, _firma_fuente(path))
+                with _datasets_lock:
+                    _datasets[path] = datos
+    _asegura_vigilante(path)
+    return datos
+
 def _checklist_filter(label: str, options, key_prefix: str):
     import streamlit as st
     opts = [str(o) for o in options]
@@ -163,17 +445,20 @@ def _checklist_filter(label: str, options, key_prefix: str):
 
     return [o for o in options if str(o) in st.session_state[state_key]]
 
-def _layout_filtros(df):
+def _layout_filtros(df, indice=None):
     col1, col2, col3, col4 = st.columns(4)
-    anios      = sorted(df["Anual"].dropna().unique().tolist())       if "Anual"    in df.columns else []
-    periodos   = sorted(df["Periodo"].dropna().unique().tolist())     if "Periodo"  in df.columns else []
-    orden_meses = ["Enero","Febrero","Marzo","Abril","Mayo","Junio","Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"]
-    if "Fecha" in df.columns:
-        meses_unicos = df["Fecha"].dropna().unique().tolist()
-        meses = [m for m in orden_meses if m in meses_unicos]
+    if indice is not None:
+        # opciones calculadas una vez por versión de la base
+        anios, periodos, meses, sucursales = [indice[c]["opciones"] if c in indice else [] for c in DIMS_FILTRO]
     else:
-        meses = []
-    sucursales = sorted(df["Sucursal"].dropna().unique().tolist())    if "Sucursal" in df.columns else []
+        anios      = sorted(df["Anual"].dropna().unique().tolist())       if "Anual"    in df.columns else []
+        periodos   = sorted(df["Periodo"].dropna().unique().tolist())     if "Periodo"  in df.columns else []
+        if "Fecha" in df.columns:
+            meses_unicos = df["Fecha"].dropna().unique().tolist()
+            meses = [m for m in ORDEN_MESES if m in meses_unicos]
+        else:
+            meses = []
+        sucursales = sorted(df["Sucursal"].dropna().unique().tolist())    if "Sucursal" in df.columns else []
 
     with col1: anio_sel     = _checklist_filter("Año",     anios,     "anio")
     with col2: periodo_sel  = _checklist_filter("Periodo", periodos,  "periodo")
@@ -181,123 +466,303 @@ def _layout_filtros(df):
     with col4: sucursal_sel = _checklist_filter("Sucursal",sucursales,"sucursal")
     return anio_sel, periodo_sel, mes_sel, sucursal_sel
 
-def _aplicar_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel):
+def _mascara_filtros(indice, filas: int, anios_sel, periodos_sel, meses_sel, sucursales_sel):
+    # OR de las máscaras de los valores elegidos en cada dimensión, AND entre dimensiones;
+    # None si ninguna dimensión filtra
+    mascara = None
+    for col, sel in zip(DIMS_FILTRO, (anios_sel, periodos_sel, meses_sel, sucursales_sel)):
+        dim = indice.get(col)
+        if dim is None or sel is None or len(sel) == 0 or len(sel) == len(dim["opciones"]):
+            continue
+        elegidas = np.zeros(filas, dtype=bool)
+        for v in sel:
+            m = dim["mascaras"].get(v)
+            if m is not None:
+                elegidas |= m
+        mascara = elegidas if mascara is None else mascara & elegidas
+    return mascara
+
+def _aplicar_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel, indice=None):
+    if indice is not None:
+        # con índice no se recorren las columnas: solo se copian las filas elegidas
+        mascara = _mascara_filtros(indice, len(df), anios_sel, periodos_sel, meses_sel, sucursales_sel)
+        return df.copy(deep=False) if mascara is None else df.take(np.flatnonzero(mascara))
     df_f = df.copy()
     if "Anual" in df_f.columns and anios_sel is not None:
-        if len(anios_sel) > 0 and len(anios_sel) != df_f["Anual"].nunique():
+        if len(anios_sel) > 0 and len(anios_sel) != df["Anual"].nunique():
             df_f = df_f[df_f["Anual"].isin(anios_sel)]
     if "Periodo" in df_f.columns and periodos_sel is not None:
-        if len(periodos_sel) > 0 and len(periodos_sel) != df_f["Periodo"].nunique():
+        if len(periodos_sel) > 0 and len(periodos_sel) != df["Periodo"].nunique():
             df_f = df_f[df_f["Periodo"].isin(periodos_sel)]
     if "Fecha" in df_f.columns and meses_sel is not None:
-        if len(meses_sel) > 0 and len(meses_sel) != df_f["Fecha"].nunique():
+        if len(meses_sel) > 0 and len(meses_sel) != df["Fecha"].nunique():
             df_f = df_f[df_f["Fecha"].isin(meses_sel)]
     if "Sucursal" in df_f.columns and sucursales_sel is not None:
-        if len(sucursales_sel) > 0 and len(sucursales_sel) != df_f["Sucursal"].nunique():
+        if len(sucursales_sel) > 0 and len(sucursales_sel) != df["Sucursal"].nunique():
             df_f = df_f[df_f["Sucursal"].isin(sucursales_sel)]
     return df_f
 
+def _div(num, den):
+    # división enmascarada en float64: NaN donde el denominador es 0
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+def _kpis(act, aa, ppto, total_act, total_aa, total_ppto):
+    return {
+        "pct_act":  act  / (total_act  if total_act  else 1),
+        "pct_aa":   aa   / (total_aa   if total_aa   else 1),
+        "vs_aa":    _div(act, aa) - 1,
+        "pct_p":    _div(act - ppto, ppto),
+        "pct_ppto": ppto / (total_ppto if total_ppto else 1),
+        "alc":      _div(act, ppto),
+    }
+
+def _firma_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel, indice=None):
+    # forma canónica: sin selección o con todo seleccionado es lo mismo que no filtrar
+    firma = []
+    for col, sel in zip(DIMS_FILTRO, (anios_sel, periodos_sel, meses_sel, sucursales_sel)):
+        if col not in df.columns or sel is None or len(sel) == 0:
+            firma.append(None)
+            continue
+        total = len(indice[col]["opciones"]) if indice is not None else df[col].nunique()
+        firma.append(None if len(sel) == total else frozenset(sel))
+    return tuple(firma)
+
+def niveles_cacheados(df, version, anios_sel, periodos_sel, meses_sel, sucursales_sel, indice=None):
+    # n0/n1/n2 compartidos entre sesiones; no se deben modificar in situ
+    clave = (version, _firma_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel, indice))
+    with _cache_niveles_lock:
+        entrada = _cache_niveles.get(clave)
+        if entrada is not None:
+            _cache_niveles.move_to_end(clave)
+            _cache_niveles_stats["hits"] += 1
+            return entrada[1]
+        _cache_niveles_stats["misses"] += 1
+
+    # se calcula fuera del lock: dos sesiones con la misma firma pueden calcular a la vez
+    niveles = None
+    if MOTOR != "pandas":
+        import motores
+        if motores.disponible(MOTOR):
+            with metricas.etapa("agregacion") as m:
+                niveles = motores.niveles(MOTOR, df, version, anios_sel, periodos_sel, meses_sel, sucursales_sel)
+                metricas.registra_df(m, *niveles)
+    if niveles is None:
+        with metricas.etapa("filtros") as m:
+            df_f = _aplicar_filtros(df, anios_sel, periodos_sel, meses_sel, sucursales_sel, indice)
+            metricas.registra_df(m, df_f)
+        with metricas.etapa("agregacion") as m:
+            niveles = _prepara_niveles(df_f)
+            metricas.registra_df(m, *niveles)
+    peso = int(sum(n.memory_usage(deep=True).sum() for n in niveles))
+
+    with _cache_niveles_lock:
+        if clave not in _cache_niveles:
+            _cache_niveles[clave] = (peso, niveles)
+            _cache_niveles_stats["bytes"] += peso
+        while _cache_niveles_stats["bytes"] > CACHE_NIVELES_MAX_BYTES and len(_cache_niveles) > 1:
+            _, (viejo, _) = _cache_niveles.popitem(last=False)
+            _cache_niveles_stats["bytes"] -= viejo
+    return niveles
+
+def estado_cache_niveles():
+    with _cache_niveles_lock:
+        return {**_cache_niveles_stats, "entradas": len(_cache_niveles), "max_bytes": CACHE_NIVELES_MAX_BYTES}
+
+def _calc_niveles(niveles, total_act, total_aa, total_ppto):
+    # un solo pase sobre los niveles 0/1/2 apilados
+    largos = [len(n) for n in niveles]
+    medidas = {c: np.concatenate([n[c].to_numpy(dtype="float64") for n in niveles]) for c in MEDIDAS}
+    kpis = _kpis(medidas["ACT"], medidas["AA"], medidas["PPTO"], total_act, total_aa, total_ppto)
+    cortes = np.cumsum(largos)[:-1]
+    partes = {k: np.split(v, cortes) for k, v in kpis.items()}
+    salida = []
+    for i, n in enumerate(niveles):
+        n = n.copy()
+        for c in MEDIDAS:
+            n[c] = n[c].astype("float64")
+        for k in kpis:
+            n[k] = partes[k][i]
+        salida.append(n)
+    return salida
+
 def _calc(df_sum, total_act, total_aa, total_ppto):
-    df = df_sum.copy()
-    df["pct_act"]  = df["ACT"] / (total_act if total_act else 1)
-    df["pct_aa"]   = df["AA"]  / (total_aa  if total_aa  else 1)
-    df["vs_aa"]    = (df["ACT"] / df["AA"].replace(0, pd.NA)) - 1
-    df["pct_p"]    = (df["ACT"] - df["PPTO"]) / df["PPTO"].replace(0, pd.NA)
-    df["pct_ppto"] = df["PPTO"] / (total_ppto if total_ppto else 1)
-    df["alc"]      = df["ACT"] / df["PPTO"].replace(0, pd.NA)
-    return df
+    return _calc_niveles([df_sum], total_act, total_aa, total_ppto)[0]
 
 def _prepara_niveles(df_f):
-    orden = [
-        "Ventas","Costo","Margen","Marketing","Contribucion",
-        "Gastos Operativos","Alquiler","Mantenimiento","Administracion Central",
-        "Royaltie","Depreciacion","Resultado Operativo","Impuestos a la Renta",
-        "Extraordinário Cash","Extraordinário No Cash","Diferencia Cambiaria",
-        "Provisiones","Resultado Neto","Flujo","EBITDA","F-Flujo"
-    ]
     for c in ["Cuentas","SubCuenta"]:
         if c not in df_f.columns:
             df_f[c] = ""
-    df_f["Cuentas"]   = df_f["Cuentas"].fillna("").astype(str).str.strip()
-    df_f["SubCuenta"] = df_f["SubCuenta"].fillna("").astype(str).str.strip()
+    df_f["Cuentas"]   = _como_categoria(df_f["Cuentas"], ORDEN_CUENTAS)
+    df_f["SubCuenta"] = _como_categoria(df_f["SubCuenta"])
 
-    niv0_base = df_f.groupby("Cuentas", as_index=False)[["ACT","AA","PPTO"]].sum()
+    niv0_base = df_f.groupby("Cuentas", as_index=False, observed=True)[["ACT","AA","PPTO"]].sum()
     niv1_base = (
-        df_f[df_f["SubCuenta"].str.strip() != ""]
-        .groupby(["Cuentas","SubCuenta"], as_index=False)[["ACT","AA","PPTO"]]
+        df_f[df_f["SubCuenta"] != ""]
+        .groupby(["Cuentas","SubCuenta"], as_index=False, observed=True)[["ACT","AA","PPTO"]]
         .sum()
     )
 
     third = _third_level_col(df_f)
     if third:
-        df_f[third] = df_f[third].fillna("").astype(str).str.strip()
-        mask_lvl2 = (df_f["SubCuenta"].str.strip() != "") & (df_f[third].str.strip() != "")
+        df_f[third] = _como_categoria(df_f[third])
+        mask_lvl2 = (df_f["SubCuenta"] != "") & (df_f[third] != "")
         niv2_base = (
             df_f[mask_lvl2]
-            .groupby(["Cuentas","SubCuenta",third], as_index=False)[["ACT","AA","PPTO"]]
+            .groupby(["Cuentas","SubCuenta",third], as_index=False, observed=True)[["ACT","AA","PPTO"]]
             .sum()
             .rename(columns={third: "Linea"})
         )
     else:
         niv2_base = pd.DataFrame(columns=["Cuentas","SubCuenta","Linea","ACT","AA","PPTO"])
+    return _completa_niveles(niv0_base, niv1_base, niv2_base)
 
-    total_act = niv0_base.loc[niv0_base["Cuentas"]=="Ventas","ACT"].sum() or niv0_base["ACT"].sum() or 1
-    total_aa  = niv0_base.loc[niv0_base["Cuentas"]=="Ventas","AA"].sum()  or niv0_base["AA"].sum()  or 1
-    total_ppt = niv0_base.loc[niv0_base["Cuentas"]=="Ventas","PPTO"].sum() or niv0_base["PPTO"].sum() or 1
+def _total_nivel0(niv0, col):
+    # base de los %: Ventas si la hay, si no el total del nivel 0
+    return niv0.loc[niv0["Cuentas"]=="Ventas", col].sum() or niv0[col].sum() or 1
 
-    niv0 = _calc(niv0_base, total_act, total_aa, total_ppt)
-    niv1 = _calc(niv1_base, total_act, total_aa, total_ppt)
-    niv2 = _calc(niv2_base, total_act, total_aa, total_ppt) if not niv2_base.empty else pd.DataFrame(
-        columns=["Cuentas","SubCuenta","Linea","ACT","AA","PPTO","pct_act","pct_aa","vs_aa","pct_p","pct_ppto","alc"]
-    )
+def _completa_niveles(niv0_base, niv1_base, niv2_base):
+    # totales, KPIs y orden de n0 sobre las sumas por nivel (común a todos los motores)
+    total_act = _total_nivel0(niv0_base, "ACT")
+    total_aa  = _total_nivel0(niv0_base, "AA")
+    total_ppt = _total_nivel0(niv0_base, "PPTO")
+
+    niv0, niv1, niv2 = _calc_niveles([niv0_base, niv1_base, niv2_base], total_act, total_aa, total_ppt)
 
-    niv0["__orden"] = niv0["Cuentas"].apply(lambda x: (orden.index(x) if x in orden else len(orden)+1, x))
-    niv0.sort_values("__orden", inplace=True)
-    niv0.reset_index(drop=True, inplace=True)
+    # el rango de cada cuenta es su código en la categórica ordenada por ORDEN_CUENTAS
+    rango = niv0["Cuentas"].cat.codes.to_numpy()
+    niv0 = niv0.iloc[np.argsort(rango, kind="stable")].reset_index(drop=True)
     return niv0, niv1, niv2
 
-def _arma_vista(n0, n1, n2, expanded):
-    filas = []
+# ---------- vista de árbol ----------
+COLS_KPI = ["ACT","pct_act","AA","pct_aa","vs_aa","pct_p","PPTO","pct_ppto","alc"]
+COLS_VISTA = ["Cuenta","Nodo","CuentaKey","SubKey","LineaKey","nivel","es_hijo","key"] + COLS_KPI
+
+def _indexa_arbol(n0, n1, n2):
+    # filas ya armadas, agrupadas por padre; se construye una vez por agregación
     ordenar_n2_para = {"gastos generales","gastos personal"}
+    raiz, hijos, nietos = [], {}, {}
+
+    for r in n0[["Cuentas"] + COLS_KPI].to_dict("records"):
+        cta = str(r.pop("Cuentas"))
+        raiz.append({"Cuenta": cta, "Nodo":"n0", "CuentaKey": cta, "SubKey":"", "LineaKey":"",
+                     "nivel":0, "es_hijo":0, "key":str(('n0', cta)), **r})
+
+    for r in n1[["Cuentas","SubCuenta"] + COLS_KPI].to_dict("records"):
+        cta, sub = str(r.pop("Cuentas")), str(r.pop("SubCuenta")).strip()
+        hijos.setdefault(cta, []).append({
+            "Cuenta": "  • " + sub, "Nodo":"n1", "CuentaKey": cta, "SubKey": sub, "LineaKey":"",
+            "nivel":1, "es_hijo":0, "key":str(('n1', cta, sub)), **r})
+
+    for r in n2[["Cuentas","SubCuenta","Linea"] + COLS_KPI].to_dict("records"):
+        cta, sub, lin = str(r.pop("Cuentas")), str(r.pop("SubCuenta")).strip(), str(r.pop("Linea"))
+        if ((cta, sub) not in N2_ALLOWED_FOR_N1) or (cta in ONE_LEVEL_N0):
+            continue
+        nietos.setdefault((cta, sub), []).append({
+            "Cuenta": "    · " + lin, "Nodo":"n2", "CuentaKey": cta, "SubKey": sub, "LineaKey": lin,
+            "nivel":2, "es_hijo":1, "key":str(('n2', cta, sub, lin)), **r})
+    for (cta, sub), filas in nietos.items():
+        if _norm(sub) in ordenar_n2_para:
+            filas.sort(key=lambda f: f["ACT"])
+
+    return {"raiz": raiz, "hijos": hijos, "nietos": nietos}
+
+def _bloque_nodo(arbol, key, expanded):
+    # filas visibles debajo de `key` cuando está abierto
+    if key[0] == 'n0':
+        filas = []
+        for h in arbol["hijos"].get(key[1], []):
+            filas.append(h)
+            if ('n1', key[1], h["SubKey"]) in expanded:
+                filas.extend(arbol["nietos"].get((key[1], h["SubKey"]), []))
+        return filas
+    if key[0] == 'n1':
+        return arbol["nietos"].get((key[1], key[2]), [])
+    return []
+
+def _filas_vista(arbol, expanded, previo=None):
+    # previo = (arbol, expanded, filas) de la corrida anterior: si solo cambió un nodo
+    # se empalma su bloque de hijos en vez de recorrer el árbol de nuevo. Ubicar el nodo
+    # sigue siendo una búsqueda lineal en las filas visibles (como el DataFrame que arma _show):
+    # lo incremental es solo la lista de filas
+    if previo is not None and previo[0] is arbol:
+        _, antes, filas = previo
+        cambios = set(antes) ^ set(expanded)
+        if not cambios:
+            return filas
+        if len(cambios) == 1:
+            key = next(iter(cambios))
+            if key[0] == 'n1' and ('n0', key[1]) not in expanded:
+                return filas  # el padre está cerrado: nada visible cambia
+            txt = str(key)
+            pos = next((i for i, f in enumerate(filas) if f["key"] == txt), None)
+            if pos is not None:
+                if key in expanded:
+                    filas[pos+1:pos+1] = _bloque_nodo(arbol, key, expanded)
+                else:
+                    del filas[pos+1:pos+1+len(_bloque_nodo(arbol, key, antes))]
+                return filas
 
-    for _, p in n0.iterrows():
-        key0 = ('n0', p["Cuentas"])
-        filas.append({
-            "Cuenta": p["Cuentas"], "Nodo":"n0",
-            "CuentaKey": p["Cuentas"], "SubKey":"", "LineaKey":"",
-            "nivel":0, "es_hijo":0, "key":str(key0),
-            "ACT":p["ACT"], "pct_act":p["pct_act"], "AA":p["AA"], "pct_aa":p["pct_aa"],
-            "vs_aa":p["vs_aa"], "pct_p":p["pct_p"], "PPTO":p["PPTO"], "pct_ppto":p["pct_ppto"], "alc":p["alc"]
-        })
+    filas = []
+    for p in arbol["raiz"]:
+        filas.append(p)
+        key0 = ('n0', p["CuentaKey"])
         if key0 in expanded:
-            hijos = n1[n1["Cuentas"] == p["Cuentas"]]
-            for _, h in hijos.iterrows():
-                sub = str(h["SubCuenta"]).strip()
-                key1 = ('n1', h["Cuentas"], sub)
-                filas.append({
-                    "Cuenta": "  • " + sub, "Nodo":"n1",
-                    "CuentaKey": h["Cuentas"], "SubKey": sub, "LineaKey":"",
-                    "nivel":1, "es_hijo":0, "key":str(key1),
-                    "ACT":h["ACT"], "pct_act":h["pct_act"], "AA":h["AA"], "pct_aa":h["pct_aa"],
-                    "vs_aa":h["vs_aa"], "pct_p":h["pct_p"], "PPTO":h["PPTO"], "pct_ppto":h["pct_ppto"], "alc":h["alc"]
-                })
-                if key1 in expanded:
-                    can_open_n2 = ((h["Cuentas"], sub) in N2_ALLOWED_FOR_N1) and (h["Cuentas"] not in ONE_LEVEL_N0)
-                    if can_open_n2:
-                        nietos = n2[(n2["Cuentas"] == h["Cuentas"]) & (n2["SubCuenta"] == sub)]
-                        if _norm(sub) in ordenar_n2_para and not nietos.empty:
-                            nietos = nietos.sort_values(by="ACT", ascending=True)
-                        for _, g in nietos.iterrows():
-                            filas.append({
-                                "Cuenta": "    · " + str(g["Linea"]), "Nodo":"n2",
-                                "CuentaKey": g["Cuentas"], "SubKey": sub, "LineaKey": str(g["Linea"]),
-                                "nivel":2, "es_hijo":1, "key": str(('n2', g["Cuentas"], sub, str(g["Linea"]))),
-                                "ACT":g["ACT"], "pct_act":g["pct_act"], "AA":g["AA"], "pct_aa":g["pct_aa"],
-                                "vs_aa":g["vs_aa"], "pct_p":g["pct_p"], "PPTO":g["PPTO"], "pct_ppto":g["pct_ppto"], "alc":g["alc"]
-                            })
-    cols = ["Cuenta","Nodo","CuentaKey","SubKey","LineaKey","nivel","es_hijo","key",
-            "ACT","pct_act","AA","pct_aa","vs_aa","pct_p","PPTO","pct_ppto","alc"]
-    return pd.DataFrame(filas, columns=cols)
+            filas.extend(_bloque_nodo(arbol, key0, expanded))
+    return filas
+
+def _nodos_abribles(arbol):
+    # todos los nodos que las reglas de expansión permiten abrir
+    abribles = {('n0', p["CuentaKey"]) for p in arbol["raiz"]
+                if p["CuentaKey"] not in NO_EXPAND_N0 and arbol["hijos"].get(p["CuentaKey"])}
+    abribles |= {('n1', c, sub) for (c, sub) in arbol["nietos"]}
+    return abribles
+
+def _vista_cliente(arbol, expanded):
+    # los tres niveles de una vez; el navegador decide qué filas se ven
+    abribles = _nodos_abribles(arbol)
+    vista = pd.DataFrame(_filas_vista(arbol, abribles), columns=COLS_VISTA)
+
+    # enlaces al padre/abuelo por id entero de fila (-1 si no tiene)
+    ids = {k: i for i, k in enumerate(vista["key"])}
+    nodos, ctas, subs = vista["Nodo"].tolist(), vista["CuentaKey"].tolist(), vista["SubKey"].tolist()
+    vista.insert(0, "id", range(len(vista)))
+    vista["padre"] = [ids.get(str(('n0', c)), -1) if n == "n1" else ids.get(str(('n1', c, s)), -1) if n == "n2" else -1
+                      for n, c, s in zip(nodos, ctas, subs)]
+    vista["abuelo"] = [ids.get(str(('n0', c)), -1) if n == "n2" else -1 for n, c in zip(nodos, ctas)]
+
+    abiertos = {str(k) for k in expanded}
+    vista["expandible"] = vista["key"].isin({str(k) for k in abribles}).astype(int)
+    vista["abierto"] = (vista["key"].isin(abiertos) & (vista["expandible"] == 1)).astype(int)
+    padre_abierto = vista["abierto"].to_numpy()
+    vista["visible"] = (
+        ((vista["padre"] < 0) | (padre_abierto[vista["padre"].clip(lower=0)] == 1))
+        & ((vista["abuelo"] < 0) | (padre_abierto[vista["abuelo"].clip(lower=0)] == 1))
+    ).astype(int)
+    return vista
+
+COLS_META = ["Nodo","CuentaKey","SubKey","LineaKey","es_hijo","key"]
+
+def _payload_compacto(vista):
+    # a la grilla solo viaja lo que se dibuja; la metadata técnica queda en Python indexada por id
+    vista = vista.reset_index(drop=True)
+    if "id" not in vista.columns:
+        vista.insert(0, "id", range(len(vista)))
+    meta = vista.set_index("id")[COLS_META]
+    datos = vista.drop(columns=COLS_META)
+    datos["nivel"] = datos["nivel"].astype("int8")
+    for c in ["ACT","AA","PPTO"]:
+        # la grilla los muestra con Math.floor: se manda el entero ya truncado
+        v = np.floor(datos[c].to_numpy(dtype="float64"))
+        datos[c] = v.astype("int64") if np.isfinite(v).all() else v
+    for c in ["pct_act","pct_aa","vs_aa","pct_p","pct_ppto","alc"]:
+        datos[c] = datos[c].astype("float64").round(DECIMALES_RATIO)
+    return datos, meta
+
+def _arma_vista(n0, n1, n2, expanded):
+    filas = _filas_vista(_indexa_arbol(n0, n1, n2), expanded)
+    return pd.DataFrame(filas, columns=COLS_VISTA)
 
 def _grid_format(gb):
     gb.configure_default_column(headerClass="center-header")
@@ -353,23 +818,12 @@ def _get_selected_row(grid_response):
         return sel.iloc[0].to_dict() if not sel.empty else None
     return None
 
-def show():
-    st.title("📊 Estado de Resultados")
-
-    if "expanded_keys" not in st.session_state:
-        st.session_state.expanded_keys = set()
-    if "grid_nonce" not in st.session_state:
-        st.session_state.grid_nonce = 0
-
-    mtime = os.path.getmtime(ARCHIVO)
-    df = cargar_datos(ARCHIVO, mtime)
-
-    anio, periodo, mes, sucursal = _layout_filtros(df)
-    df_f = _aplicar_filtros(df, anio, periodo, mes, sucursal)
-
-    n0, n1, n2 = _prepara_niveles(df_f)
-    vista = _arma_vista(n0, n1, n2, st.session_state.expanded_keys)
+def precalienta():
+    # carga la base y deja en la caché compartida la vista sin filtros, que es la primera que se abre
+    datos = dataset_actual(FUENTE)
+    niveles_cacheados(datos["df"], datos["version"], None, None, None, None, datos["indice"])
 
+def _muestra_grilla(vista, datos_key=""):
     gb = GridOptionsBuilder.from_dataframe(vista)
 
     gb.configure_default_column(groupable=False, editable=False, resizable=True, sortable=True,
@@ -386,14 +840,22 @@ def show():
 
     empty_getter = JsCode("function(params){ return ''; }")
     for tech_col in ["Nodo","CuentaKey","SubKey","LineaKey"]:
-        gb.configure_column(tech_col, header_name=tech_col, valueGetter=empty_getter,
-                            width=1, maxWidth=1, minWidth=1)
-    gb.configure_column("nivel", hide=True)
-    gb.configure_column("es_hijo", hide=True)
-    gb.configure_column("key", hide=True)
+        if tech_col in vista.columns:
+            gb.configure_column(tech_col, header_name=tech_col, valueGetter=empty_getter,
+                                width=1, maxWidth=1, minWidth=1)
+    for tech_col in ["nivel","es_hijo","key","id","padre","abuelo","expandible","abierto","visible"]:
+        if tech_col in vista.columns:
+            gb.configure_column(tech_col, hide=True)
 
     gb = _grid_format(gb)
 
+    if EXPANSION_EN_CLIENTE:
+        gb.configure_column("Cuenta", valueFormatter=tree_cuenta_fmt)
+        gb.configure_grid_options(getRowId=tree_row_id,
+                                  isExternalFilterPresent=tree_filter_present,
+                                  doesExternalFilterPass=tree_filter_pass,
+                                  onCellClicked=tree_toggle)
+
     gb.configure_grid_options(rowHeight=24, headerHeight=26, domLayout='normal',
                               enableFilter=False, floatingFilter=False)
 
@@ -426,6 +888,15 @@ def show():
 
     gb.configure_selection(selection_mode="single", use_checkbox=False)
 
+    if EXPANSION_EN_CLIENTE:
+        # la grilla no devuelve nada a Python: abrir/cerrar no provoca rerun ni remount.
+        # st_aggrid solo carga las filas al montarse: la key cambia cuando cambian los datos
+        update_mode = GridUpdateMode.NO_UPDATE
+        grid_key = f"grid_tree_cliente_{datos_key}_{st.session_state.get('_filters_nonce', 0)}"
+    else:
+        update_mode = GridUpdateMode.MODEL_CHANGED
+        grid_key = f"grid_tree_{datos_key}_{len(st.session_state.expanded_keys)}_{st.session_state.grid_nonce}_{st.session_state.get('_filters_nonce', 0)}"
+
     left, mid, right = st.columns([1, 9, 1])
     with mid:
         grid = AgGrid(
@@ -436,7 +907,8 @@ def show():
             height=600,
             allow_unsafe_jscode=True,
             theme="balham",
-            key=f"grid_tree_{len(st.session_state.expanded_keys)}_{st.session_state.grid_nonce}_{st.session_state.get('_filters_nonce', 0)}",
+            update_mode=update_mode,
+            key=grid_key,
             custom_css=custom_css,
             custom_js_events={
                 "onGridReady": auto_size_js,
@@ -445,8 +917,94 @@ def show():
                 "onGridSizeChanged": auto_size_js
             }
         )
+    return grid
+
+def show():
+    metricas.inicia_servidor()
+    metricas.inicia_corrida()
+    try:
+        _show()
+    finally:
+        for k, v in estado_cache_niveles().items():
+            metricas.fija(f"pnl_cache_niveles_{k}", v)
+        metricas.cierra_corrida()
+
+def _show():
+    st.title("📊 Estado de Resultados")
+
+    if "expanded_keys" not in st.session_state:
+        st.session_state.expanded_keys = set()
+    if "grid_nonce" not in st.session_state:
+        st.session_state.grid_nonce = 0
+
+    with metricas.etapa("carga") as m:
+        datos = dataset_actual(FUENTE)
+        metricas.registra_df(m, datos["df"])
+    version, df, indice = datos["version"], datos["df"], datos["indice"]
+    if datos["error"]:
+        st.caption(f"⚠️ La última versión de la base no se pudo cargar ({datos['error']}); se muestran los datos anteriores.")
+
+    with metricas.etapa("filtros_ui"):
+        anio, periodo, mes, sucursal = _layout_filtros(df, indice)
+
+    # el árbol indexado se reutiliza mientras no cambien los datos, los filtros ni el escenario
+    import escenarios
+    escenario = escenarios.activo()
+    firma = (version, _firma_filtros(df, anio, periodo, mes, sucursal, indice), escenarios.firma(escenario))
+    cache = st.session_state.get("_arbol_cache")
+    if cache is None or cache[0] != firma:
+        with metricas.etapa("niveles") as m:
+            base = niveles_cacheados(df, version, anio, periodo, mes, sucursal, indice)
+            metricas.registra_df(m, *base)
+        n0, n1, n2 = base
+        if escenario:
+            with metricas.etapa("escenario") as m:
+                n0, n1, n2 = escenarios.niveles_escenario(df, indice, version, (anio, periodo, mes, sucursal),
+                                                          base, *escenario)
+                metricas.registra_df(m, n0, n1, n2)
+        with metricas.etapa("arbol"):
+            # los niveles sin escenario quedan a mano para el panel de escenarios
+            cache = (firma, _indexa_arbol(n0, n1, n2), base)
+        st.session_state["_arbol_cache"] = cache
+    arbol, niveles_base = cache[1], cache[2]
+
+    with metricas.etapa("vista") as m:
+        if EXPANSION_EN_CLIENTE:
+            vista = _vista_cliente(arbol, st.session_state.expanded_keys)
+        else:
+            filas = _filas_vista(arbol, st.session_state.expanded_keys, st.session_state.get("_vista_cache"))
+            st.session_state["_vista_cache"] = (arbol, frozenset(st.session_state.expanded_keys), filas)
+            vista = pd.DataFrame(filas, columns=COLS_VISTA)  # se rearma entero: lineal en filas visibles
+        metricas.registra_df(m, vista)
+
+    with metricas.etapa("payload") as m:
+        if PAYLOAD_COMPACTO:
+            datos_grilla, meta = _payload_compacto(vista)
+        else:
+            datos_grilla, meta = vista, None
+        metricas.registra_df(m, datos_grilla)
+
+    with metricas.etapa("grilla"):
+        # versión + escenario: lo que cambia las filas sin pasar por los filtros
+        datos_key = hashlib.sha1(repr((version, escenarios.firma(escenario))).encode()).hexdigest()[:10]
+        grid = _muestra_grilla(datos_grilla, datos_key)
+
+    from comparativos import muestra_comparativos
+    with metricas.etapa("comparativos"):
+        muestra_comparativos(df, version, anio, mes, sucursal)
+
+    from exportacion import muestra_exportacion
+    muestra_exportacion(df, anio, periodo, mes, sucursal, version)
+
+    with metricas.etapa("escenarios"):
+        escenarios.muestra_escenarios(df, indice, version, (anio, periodo, mes, sucursal), niveles_base)
+
+    if EXPANSION_EN_CLIENTE:
+        return
 
     row = _get_selected_row(grid)
+    if row and meta is not None and row.get("id") is not None:
+        row = {**meta.loc[int(row["id"])].to_dict(), **row}
     if row:
         nodo = (row.get("Nodo") or "").strip()
 